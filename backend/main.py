@@ -1,30 +1,40 @@
 """
 Main FastAPI application for Eco-Accounting SaaS
 """
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, Security
+from fastapi.security import HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from mangum import Mangum
-from typing import List, Optional
+from typing import List, Mapping, Optional
+import asyncio
 import os
+import orjson
+from cachetools import TTLCache
+from collections import defaultdict
 from datetime import datetime, timedelta
+from decimal import Decimal
+from types import MappingProxyType
 
 from models.schemas import (
     BillUploadRequest,
     BillResponse,
+    BillStatusEnum,
+    BillTypeEnum,
     EmissionResponse,
     ReportGenerationRequest,
     ReportResponse,
     DashboardStats,
     ComplianceStatusResponse,
     CarbonCreditResponse,
+    CarbonCreditPurchase,
     SuccessResponse,
     ErrorResponse,
 )
 from services.carbon_calculator import get_calculator
-from services.auth import get_cognito_auth, get_current_user, get_current_user_optional, CognitoAuth
-from models.database import init_db, get_db_session, Organization, Bill, Emission
-from sqlalchemy.orm import Session
+from services.auth import get_cognito_auth, get_current_user, get_current_user_optional, CognitoAuth, security
+from models.database import init_db, get_db_session, utcnow, Organization, Bill, Emission, CarbonCredit
+from sqlalchemy.orm import Session, raiseload
 from pydantic import BaseModel, EmailStr
 
 # Initialize FastAPI app
@@ -32,12 +42,16 @@ app = FastAPI(
     title="Eco-Accounting SaaS API",
     description="AI-powered environmental reporting and carbon footprint tracking",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
+# Until organizations come from authentication, every request acts on this one
+DEFAULT_ORG_ID = 1
+
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database tables on startup"""
+    """Initialize the database engine and session factory on startup"""
     try:
         init_db()
         print("✅ Database initialized successfully")
@@ -45,6 +59,104 @@ async def startup_event():
         print(f"⚠️ Database initialization warning: {e}")
         # Continue running even if DB init fails (for demo purposes)
 
+    # Pre-warm AWS clients so the first requests don't pay for client setup
+    try:
+        from services.aws_services import get_s3_service, get_bedrock_service
+        get_s3_service()
+        get_bedrock_service()
+    except Exception as e:
+        print(f"⚠️ AWS client initialization warning: {e}")
+
+# Read-only endpoints whose responses only change when an organization's
+# bills, emissions or reports change
+ETAG_CACHEABLE_PATHS = {
+    "/api/dashboard/stats",
+    "/api/reports",
+    "/api/compliance/status",
+    "/api/bills",
+}
+
+
+# Body ETag of each cacheable response, keyed by request, date and the data
+# fingerprint it was rendered from, so a matching If-None-Match can be
+# answered without running the handler
+_ETAG_CACHE = TTLCache(maxsize=1024, ttl=3600)
+
+
+def compute_data_fingerprint(org_id: int) -> tuple:
+    """
+    Row counts and latest timestamps of an organization's bills, emissions
+    and reports, fetched in one query
+    """
+    import models.database as database
+    from models.database import Report
+    from sqlalchemy import select, func
+
+    db = database.SessionLocal()
+
+    try:
+        def scalar(column, model):
+            return select(column).where(model.organization_id == org_id).scalar_subquery()
+
+        return tuple(db.execute(select(
+            scalar(func.count(Bill.id), Bill),
+            scalar(func.max(Bill.created_at), Bill),
+            scalar(func.max(Bill.processed_at), Bill),
+            scalar(func.max(Bill.validated_at), Bill),
+            scalar(func.count(Emission.id), Emission),
+            scalar(func.max(Emission.created_at), Emission),
+            scalar(func.count(Report.id), Report),
+            scalar(func.max(Report.created_at), Report),
+        )).one())
+    finally:
+        db.close()
+
+
+@app.middleware("http")
+async def etag_middleware(request, call_next):
+    """Tag cacheable reads with a body ETag and answer repeats with 304"""
+    if request.method != "GET" or request.url.path not in ETAG_CACHEABLE_PATHS:
+        return await call_next(request)
+
+    import hashlib
+
+    cache_headers = {"Cache-Control": "private, max-age=30"}
+    if_none_match = request.headers.get("if-none-match")
+    client_tags = {tag.strip() for tag in if_none_match.split(",")} if if_none_match else set()
+
+    # Only conditional requests pay for the fingerprint query. The current
+    # date is part of the key because the dashboard's monthly window moves
+    # with it even when no rows change.
+    fingerprint_key = None
+    if client_tags:
+        try:
+            fingerprint = await asyncio.to_thread(compute_data_fingerprint, DEFAULT_ORG_ID)
+            fingerprint_key = (f"{request.url.path}?{request.url.query}", utcnow().date(), fingerprint)
+        except Exception as e:
+            print(f"⚠️ ETag fingerprint warning: {e}")
+
+        etag = _ETAG_CACHE.get(fingerprint_key) if fingerprint_key else None
+        if etag in client_tags:
+            return Response(status_code=304, headers={"ETag": etag, **cache_headers})
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    if fingerprint_key:
+        _ETAG_CACHE[fingerprint_key] = etag
+    cache_headers["ETag"] = etag
+
+    if etag in client_tags:
+        return Response(status_code=304, headers=cache_headers)
+
+    headers = dict(response.headers)
+    headers.update(cache_headers)
+    return Response(content=body, status_code=200, headers=headers, media_type=response.media_type)
+
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -59,7 +171,7 @@ app.add_middleware(
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "healthy", "timestamp": utcnow().isoformat()}
 
 
 # Root endpoint
@@ -105,28 +217,30 @@ class ConfirmForgotPasswordRequest(BaseModel):
 
 
 # Authentication endpoints
+# Cognito calls are blocking boto3 requests, so each one runs in a worker
+# thread and concurrent auth requests overlap instead of queueing
 @app.post("/api/auth/signup")
 async def signup(request: SignUpRequest, auth: CognitoAuth = Depends(get_cognito_auth)):
     """Register a new user"""
-    return auth.sign_up(request.email, request.password, request.full_name)
+    return await asyncio.to_thread(auth.sign_up, request.email, request.password, request.full_name)
 
 
 @app.post("/api/auth/confirm-signup")
 async def confirm_signup(request: ConfirmSignUpRequest, auth: CognitoAuth = Depends(get_cognito_auth)):
     """Confirm user registration with verification code"""
-    return auth.confirm_sign_up(request.email, request.confirmation_code)
+    return await asyncio.to_thread(auth.confirm_sign_up, request.email, request.confirmation_code)
 
 
 @app.post("/api/auth/signin")
 async def signin(request: SignInRequest, auth: CognitoAuth = Depends(get_cognito_auth)):
     """Sign in and get JWT tokens"""
-    return auth.sign_in(request.email, request.password)
+    return await asyncio.to_thread(auth.sign_in, request.email, request.password)
 
 
 @app.post("/api/auth/refresh")
 async def refresh_token(request: RefreshTokenRequest, auth: CognitoAuth = Depends(get_cognito_auth)):
     """Refresh access token"""
-    return auth.refresh_token(request.refresh_token)
+    return await asyncio.to_thread(auth.refresh_token, request.refresh_token)
 
 
 @app.get("/api/auth/me")
@@ -136,119 +250,189 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 
 
 @app.post("/api/auth/signout")
-async def signout(current_user: dict = Depends(get_current_user), auth: CognitoAuth = Depends(get_cognito_auth)):
+async def signout(
+    credentials: HTTPAuthorizationCredentials = Security(security),
+    current_user: dict = Depends(get_current_user),
+    auth: CognitoAuth = Depends(get_cognito_auth)
+):
     """Sign out current user"""
-    # Extract token from current_user (it's stored in token_claims)
-    # For now, return success message
-    return {"message": "Signed out successfully"}
+    return await asyncio.to_thread(auth.sign_out, credentials.credentials)
 
 
 @app.post("/api/auth/forgot-password")
 async def forgot_password(request: ForgotPasswordRequest, auth: CognitoAuth = Depends(get_cognito_auth)):
     """Request password reset"""
-    return auth.forgot_password(request.email)
+    return await asyncio.to_thread(auth.forgot_password, request.email)
 
 
 @app.post("/api/auth/confirm-forgot-password")
 async def confirm_forgot_password(request: ConfirmForgotPasswordRequest, auth: CognitoAuth = Depends(get_cognito_auth)):
     """Confirm password reset with code"""
-    return auth.confirm_forgot_password(request.email, request.confirmation_code, request.new_password)
+    return await asyncio.to_thread(
+        auth.confirm_forgot_password, request.email, request.confirmation_code, request.new_password
+    )
 
 
 # Bills endpoints
-@app.post("/api/bills/upload", response_model=SuccessResponse)
+def process_bill_extraction(bill_id: int, s3_key: str, bill_type: Optional[str] = None):
+    """
+    Extract bill data with Claude Vision and record its emissions.
+    Runs after the upload request has been answered (a background task
+    under uvicorn, its own async invocation on Lambda), so it opens its own
+    database session and reads the bill back from S3.
+    """
+    import time
+    import models.database as database
+    from models.database import BillStatus, BillType
+    from services.aws_services import get_bedrock_service, get_s3_service
+    from datetime import datetime as dt
+
+    db = database.SessionLocal()
+    started = time.monotonic()
+
+    try:
+        bill = db.query(Bill).filter(Bill.id == bill_id).first()
+        if not bill:
+            return
+
+        try:
+            file_content = get_s3_service().download_file(s3_key)
+            extracted_data = get_bedrock_service().extract_bill_data_from_image(
+                file_content,
+                bill_type=bill_type
+            )
+            bill.extracted_data = extracted_data
+            bill.status = BillStatus.EXTRACTED
+
+            # Calculate emissions from extracted data
+            if extracted_data.get('consumption_amount') and extracted_data.get('bill_type'):
+                calculator = get_calculator()
+                bill_type_extracted = extracted_data['bill_type']
+
+                if bill_type_extracted == 'electricity':
+                    emission_result = calculator.calculate_electricity_emissions(
+                        consumption_kwh=float(extracted_data['consumption_amount']),
+                        country="UAE",  # Default for demo
+                        region="Dubai"
+                    )
+
+                    # Store emission record
+                    emission = Emission(
+                        bill=bill,
+                        organization_id=bill.organization_id,
+                        source_type=BillType.ELECTRICITY,
+                        category="Scope 2",
+                        consumption_amount=emission_result.consumption_amount,
+                        consumption_unit="kWh",
+                        emission_factor=emission_result.emission_factor,
+                        total_co2e=emission_result.total_co2e,
+                        period_start=dt.fromisoformat(extracted_data['billing_period_start'][:10]) if extracted_data.get('billing_period_start') else utcnow(),
+                        period_end=dt.fromisoformat(extracted_data['billing_period_end'][:10]) if extracted_data.get('billing_period_end') else utcnow()
+                    )
+                    db.add(emission)
+                    bill.status = BillStatus.VALIDATED
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            db.rollback()
+            bill.status = BillStatus.FAILED
+            bill.error_message = str(e)
+
+        bill.processed_at = utcnow()
+        bill.processing_time = time.monotonic() - started
+        db.commit()
+
+        if bill.status == BillStatus.VALIDATED:
+            # New emissions invalidate this org's cached estimate totals
+            _EMISSIONS_VERSION[bill.organization_id] += 1
+    finally:
+        db.close()
+
+
+def queue_bill_extraction(bill_id: int, s3_key: str, bill_type: Optional[str] = None):
+    """
+    Queue bill extraction as an async ("Event") invocation of this Lambda
+    function; `handler` routes the payload to process_bill_extraction.
+    """
+    from services.aws_services import get_lambda_client
+
+    get_lambda_client().invoke(
+        FunctionName=os.environ['AWS_LAMBDA_FUNCTION_NAME'],
+        InvocationType='Event',
+        Payload=orjson.dumps({
+            "task": "process_bill_extraction",
+            "bill_id": bill_id,
+            "s3_key": s3_key,
+            "bill_type": bill_type
+        })
+    )
+
+
+@app.post("/api/bills/upload", response_model=SuccessResponse, status_code=202)
 async def upload_bill(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     bill_type: Optional[str] = Form(None),
     db: Session = Depends(get_db_session)
 ):
     """
-    Upload a bill for processing with AI extraction
+    Upload a bill and queue it for AI extraction.
+    Returns immediately; poll the bill until its status leaves "processing".
     """
     try:
-        from services.aws_services import get_s3_service, get_bedrock_service
-        from datetime import datetime as dt
-
-        # Read file content
-        file_content = await file.read()
+        from services.aws_services import get_s3_service
+        from models.database import BillStatus, BillType
 
         # Generate S3 key
-        timestamp = dt.utcnow().strftime("%Y%m%d_%H%M%S")
+        timestamp = utcnow().strftime("%Y%m%d_%H%M%S")
         s3_key = f"bills/{timestamp}_{file.filename}"
 
-        # Upload to S3
+        # Stream the spooled upload to S3 in multipart chunks
         s3_service = get_s3_service()
-        s3_url = s3_service.upload_file(
-            file_content=file_content,
+        s3_url = await asyncio.to_thread(
+            s3_service.upload_fileobj,
+            file.file,
             key=s3_key,
             metadata={"bill_type": bill_type or "unknown"}
         )
 
-        # Create bill record in database (initial)
-        from models.database import BillStatus, BillType
+        # Create bill record; extraction fills it in later
         bill = Bill(
-            organization_id=1,  # Default org for demo
+            organization_id=DEFAULT_ORG_ID,
             file_name=file.filename,
             file_path=s3_url,
+            file_size=file.size,
+            mime_type=file.content_type,
             bill_type=BillType(bill_type) if bill_type else BillType.OTHER,
             status=BillStatus.PROCESSING
         )
         db.add(bill)
-        db.commit()
-        db.refresh(bill)
-
-        # Extract data using Claude Vision (async processing)
-        bedrock_service = get_bedrock_service()
-        extracted_data = bedrock_service.extract_bill_data_from_image(
-            file_content,
-            bill_type=bill_type
-        )
-
-        # Update bill with extracted data
-        bill.extracted_data = extracted_data
-        bill.status = BillStatus.EXTRACTED
-
-        # Calculate emissions from extracted data
-        if extracted_data.get('consumption_amount') and extracted_data.get('bill_type'):
-            calculator = get_calculator()
-            bill_type_extracted = extracted_data['bill_type']
-
-            if bill_type_extracted == 'electricity':
-                emission_result = calculator.calculate_electricity_emissions(
-                    consumption_kwh=float(extracted_data['consumption_amount']),
-                    country="UAE",  # Default for demo
-                    region="Dubai"
-                )
-
-                # Store emission record
-                from models.database import BillType as BT
-                emission = Emission(
-                    bill_id=bill.id,
-                    organization_id=1,
-                    source_type=BT.ELECTRICITY,
-                    category="Scope 2",
-                    consumption_amount=emission_result['consumption_amount'],
-                    consumption_unit="kWh",
-                    emission_factor=emission_result['emission_factor'],
-                    total_co2e=emission_result['total_co2e'],
-                    period_start=dt.strptime(extracted_data.get('billing_period_start', dt.utcnow().isoformat()[:10]), "%Y-%m-%d") if extracted_data.get('billing_period_start') else dt.utcnow(),
-                    period_end=dt.strptime(extracted_data.get('billing_period_end', dt.utcnow().isoformat()[:10]), "%Y-%m-%d") if extracted_data.get('billing_period_end') else dt.utcnow()
-                )
-                db.add(emission)
-                bill.status = BillStatus.VALIDATED
-
-        db.commit()
-        db.refresh(bill)
+        await asyncio.to_thread(db.commit)
+
+        # Claude Vision extraction takes seconds, so it runs after the
+        # response is sent instead of holding the connection open. Mangum
+        # only returns once background tasks finish, so on Lambda the job
+        # goes to a separate async invocation instead.
+        if os.getenv('AWS_LAMBDA_FUNCTION_NAME'):
+            try:
+                await asyncio.to_thread(queue_bill_extraction, bill.id, s3_key, bill_type)
+            except Exception as e:
+                bill.status = BillStatus.FAILED
+                bill.error_message = f"Could not queue extraction: {e}"
+                await asyncio.to_thread(db.commit)
+                raise
+        else:
+            background_tasks.add_task(process_bill_extraction, bill.id, s3_key, bill_type)
 
         return SuccessResponse(
             success=True,
-            message="Bill uploaded and processed successfully",
+            message="Bill uploaded and queued for processing",
             data={
                 "bill_id": bill.id,
                 "file_name": file.filename,
                 "bill_type": bill_type,
                 "status": bill.status.value,
-                "extracted_data": extracted_data
+                "poll_url": f"/api/bills/{bill.id}"
             }
         )
     except Exception as e:
@@ -257,46 +441,81 @@ async def upload_bill(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/bills", response_model=List[BillResponse])
+@app.get("/api/bills", response_model=None, responses={200: {"model": List[BillResponse]}})
 async def list_bills(
     skip: int = 0,
     limit: int = 20,
     bill_type: Optional[str] = None,
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
     db: Session = Depends(get_db_session)
 ):
     """
-    List all bills for an organization
+    List all bills for an organization.
+    Pass the created_at and id of the last bill seen as `before` and
+    `before_id` to page by cursor instead of offset.
     """
-    query = db.query(Bill).filter(Bill.organization_id == 1)  # Default org
+    from sqlalchemy import select, lambda_stmt, tuple_
+
+    org_id = DEFAULT_ORG_ID
+
+    # Select only the columns we return, skipping ORM instance construction.
+    # lambda_stmt caches both the statement construction and its compiled
+    # SQL across requests; the closure values are sent as bound parameters.
+    query = lambda_stmt(lambda: select(
+        Bill.id,
+        Bill.organization_id,
+        Bill.file_name,
+        Bill.bill_type,
+        Bill.status,
+        Bill.extracted_data,
+        Bill.ocr_confidence,
+        Bill.created_at,
+        Bill.processed_at
+    ).where(Bill.organization_id == org_id))
 
     if bill_type:
         from models.database import BillType
-        query = query.filter(Bill.bill_type == BillType(bill_type))
-
-    bills = query.order_by(Bill.created_at.desc()).offset(skip).limit(limit).all()
-
+        bill_type_filter = BillType(bill_type)
+        query += lambda s: s.where(Bill.bill_type == bill_type_filter)
+    # id breaks created_at ties, so rows sharing the last timestamp of a
+    # page are not skipped
+    if before and before_id is not None:
+        query += lambda s: s.where(tuple_(Bill.created_at, Bill.id) < tuple_(before, before_id))
+    elif before:
+        query += lambda s: s.where(Bill.created_at < before)
+
+    query += lambda s: s.order_by(Bill.created_at.desc(), Bill.id.desc()).offset(skip).limit(limit)
+    bills = db.execute(query).all()
+
+    # Rows already have the BillResponse shape, so return plain dicts and
+    # skip re-validating every item on the way out
     return [
-        BillResponse(
-            id=bill.id,
-            organization_id=bill.organization_id,
-            file_name=bill.file_name,
-            bill_type=bill.bill_type.value,
-            status=bill.status.value,
-            extracted_data=bill.extracted_data or {},
-            created_at=bill.created_at,
-            processed_at=bill.created_at
-        )
+        {
+            "id": bill.id,
+            "organization_id": bill.organization_id,
+            "file_name": bill.file_name,
+            "bill_type": bill.bill_type.value,
+            "status": bill.status.value,
+            "extracted_data": bill.extracted_data or {},
+            "ocr_confidence": bill.ocr_confidence,
+            "created_at": bill.created_at,
+            "processed_at": bill.processed_at
+        }
         for bill in bills
     ]
 
 
 @app.get("/api/bills/{bill_id}", response_model=BillResponse)
-async def get_bill(bill_id: int):
+async def get_bill(bill_id: int, db: Session = Depends(get_db_session)):
     """
     Get bill details by ID
     """
-    # TODO: Implement database query
-    raise HTTPException(status_code=404, detail="Bill not found")
+    bill = db.query(Bill).filter(Bill.id == bill_id).first()
+    if not bill:
+        raise HTTPException(status_code=404, detail="Bill not found")
+
+    return BillResponse.model_validate(bill)
 
 
 @app.post("/api/bills/{bill_id}/validate", response_model=SuccessResponse)
@@ -317,7 +536,6 @@ async def download_bill(bill_id: int, db: Session = Depends(get_db_session)):
     """
     Download bill PDF from S3
     """
-    from fastapi.responses import Response
     from services.aws_services import get_s3_service
 
     # Get bill from database
@@ -332,17 +550,15 @@ async def download_bill(bill_id: int, db: Session = Depends(get_db_session)):
     # file_path format: s3://bucket-name/key
     s3_key = bill.file_path.replace(f"s3://{bucket_name}/", "")
 
-    # Download from S3
+    # Stream from S3 in chunks instead of buffering the whole file
     try:
-        pdf_bytes = s3_service.download_file(s3_key)
+        body, content_length = await asyncio.to_thread(s3_service.stream_file, s3_key)
 
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={bill.file_name}"
-            }
-        )
+        headers = {"Content-Disposition": f"attachment; filename={bill.file_name}"}
+        if content_length is not None:
+            headers["Content-Length"] = str(content_length)
+
+        return StreamingResponse(body, media_type="application/pdf", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to download bill: {str(e)}")
 
@@ -376,17 +592,17 @@ async def calculate_emissions(
 
         return EmissionResponse(
             id=0,  # TODO: Get from database
-            organization_id=1,  # TODO: Get from auth
+            organization_id=DEFAULT_ORG_ID,  # TODO: Get from auth
             bill_id=bill_id,
-            category=result["category"],
-            source_type=result["source_type"],
-            consumption_amount=result["consumption_amount"],
-            consumption_unit=result["consumption_unit"],
-            emission_factor=result["emission_factor"],
-            total_co2e=result["total_co2e"],
-            period_start=datetime.utcnow() - timedelta(days=30),
-            period_end=datetime.utcnow(),
-            created_at=datetime.utcnow()
+            category=result.category,
+            source_type=result.source_type,
+            consumption_amount=result.consumption_amount,
+            consumption_unit=result.consumption_unit,
+            emission_factor=result.emission_factor,
+            total_co2e=result.total_co2e,
+            period_start=utcnow() - timedelta(days=30),
+            period_end=utcnow(),
+            created_at=utcnow()
         )
 
     except Exception as e:
@@ -399,39 +615,51 @@ async def list_emissions(
     limit: int = 50,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
     db: Session = Depends(get_db_session)
 ):
     """
-    List emissions for an organization
+    List emissions for an organization.
+    Pass the created_at and id of the last emission seen as `before` and
+    `before_id` to page by cursor instead of offset.
     """
-    org_id = 1  # Default organization
-
-    query = db.query(Emission).filter(Emission.organization_id == org_id)
+    from sqlalchemy import select, lambda_stmt, tuple_
+
+    org_id = DEFAULT_ORG_ID
+
+    # Select only the columns we return, skipping ORM instance construction.
+    # lambda_stmt caches the statement and its compiled SQL across requests.
+    query = lambda_stmt(lambda: select(
+        Emission.id,
+        Emission.bill_id,
+        Emission.organization_id,
+        Emission.category,
+        Emission.source_type,
+        Emission.consumption_amount,
+        Emission.consumption_unit,
+        Emission.emission_factor,
+        Emission.total_co2e,
+        Emission.period_start,
+        Emission.period_end,
+        Emission.created_at
+    ).where(Emission.organization_id == org_id))
 
     if start_date:
-        query = query.filter(Emission.period_start >= start_date)
+        query += lambda s: s.where(Emission.period_start >= start_date)
     if end_date:
-        query = query.filter(Emission.period_end <= end_date)
+        query += lambda s: s.where(Emission.period_end <= end_date)
+    if before and before_id is not None:
+        query += lambda s: s.where(tuple_(Emission.created_at, Emission.id) < tuple_(before, before_id))
+    elif before:
+        query += lambda s: s.where(Emission.created_at < before)
 
-    emissions = query.order_by(Emission.created_at.desc()).offset(skip).limit(limit).all()
+    query += lambda s: s.order_by(Emission.created_at.desc(), Emission.id.desc()).offset(skip).limit(limit)
+    emissions = db.execute(query).all()
 
-    return [
-        {
-            "id": e.id,
-            "bill_id": e.bill_id,
-            "organization_id": e.organization_id,
-            "category": e.category,
-            "source_type": e.source_type.value if e.source_type else None,
-            "consumption_amount": e.consumption_amount,
-            "consumption_unit": e.consumption_unit,
-            "emission_factor": e.emission_factor,
-            "total_co2e": e.total_co2e,
-            "period_start": e.period_start.isoformat() if e.period_start else None,
-            "period_end": e.period_end.isoformat() if e.period_end else None,
-            "created_at": e.created_at.isoformat() if e.created_at else None
-        }
-        for e in emissions
-    ]
+    # The selected columns are exactly the response fields, so each row's
+    # mapping is the item; the encoder turns the source_type enum into its value
+    return [dict(e._mapping) for e in emissions]
 
 
 @app.get("/api/emissions/summary")
@@ -458,28 +686,51 @@ async def generate_report(request: ReportGenerationRequest, db: Session = Depend
     Generate an environmental report (GRI, CDP, TCFD)
     """
     try:
+        import hashlib
+        import io
         from services.report_generator import get_report_generator
         from services.aws_services import get_s3_service
         from models.database import Report, ReportType as RT
-        from datetime import datetime as dt
 
-        org_id = 1  # Default organization
+        org_id = DEFAULT_ORG_ID
 
         # Get organization data
         org = db.query(Organization).filter(Organization.id == org_id).first()
         if not org:
             raise HTTPException(status_code=404, detail="Organization not found")
 
-        # Get emissions data for the period
-        emissions = db.query(Emission).filter(
+        period_filter = (
             Emission.organization_id == org_id,
             Emission.period_start >= request.period_start,
             Emission.period_end <= request.period_end
-        ).all()
+        )
 
-        if not emissions:
+        # Per-scope, per-source totals and row counts for the period,
+        # aggregated in SQL; the PDF only shows these, so the generator gets
+        # one row per source instead of every emission record
+        from sqlalchemy import func
+        source_rows = db.query(
+            Emission.category,
+            Emission.source_type,
+            func.min(Emission.consumption_unit),
+            func.sum(Emission.consumption_amount),
+            func.sum(Emission.total_co2e),
+            func.count(Emission.id)
+        ).filter(*period_filter).group_by(
+            Emission.category, Emission.source_type
+        ).order_by(Emission.category, Emission.source_type).all()
+
+        scope_totals = defaultdict(float)
+        for category, _, _, _, total, _ in source_rows:
+            scope_totals[category] += float(total or 0)
+        emissions_count = sum(row[-1] for row in source_rows)
+
+        if not emissions_count:
             raise HTTPException(status_code=400, detail="No emissions data found for the specified period")
 
+        if request.report_type != "GRI-305":
+            raise HTTPException(status_code=400, detail=f"Report type {request.report_type} not yet supported")
+
         # Prepare organization data
         org_data = {
             "name": org.name,
@@ -488,75 +739,90 @@ async def generate_report(request: ReportGenerationRequest, db: Session = Depend
             "region": org.region
         }
 
-        # Prepare emissions data
         emissions_data = [
             {
-                "source_type": e.source_type.value if e.source_type else "unknown",
-                "category": e.category,
-                "consumption_amount": e.consumption_amount,
-                "consumption_unit": e.consumption_unit,
-                "emission_factor": e.emission_factor,
-                "total_co2e": e.total_co2e,
-                "period_start": e.period_start,
-                "period_end": e.period_end
+                "source_type": source_type.value if source_type else "unknown",
+                "category": category,
+                "consumption_amount": float(consumption or 0),
+                "consumption_unit": unit,
+                "total_co2e": float(total or 0)
             }
-            for e in emissions
+            for category, source_type, unit, consumption, total, _ in source_rows
         ]
 
-        # Generate report PDF
-        generator = get_report_generator()
-
-        if request.report_type == "GRI-305":
-            pdf_bytes = generator.generate_gri_305_report(
-                org_data, emissions_data, request.period_start, request.period_end
-            )
-        else:
-            raise HTTPException(status_code=400, detail=f"Report type {request.report_type} not yet supported")
-
-        # Upload to S3
-        s3_service = get_s3_service()
-        timestamp = dt.utcnow().strftime("%Y%m%d_%H%M%S")
-        s3_key = f"reports/{org_id}/{request.report_type}_{timestamp}.pdf"
-        s3_url = s3_service.upload_file(
-            file_content=pdf_bytes,
-            key=s3_key,
-            metadata={
-                "report_type": request.report_type,
-                "organization_id": str(org_id)
-            }
-        )
+        # Fingerprint of everything the PDF renders
+        data_hash = hashlib.sha256(orjson.dumps(
+            {"organization": org_data, "emissions": emissions_data},
+            option=orjson.OPT_SORT_KEYS
+        )).hexdigest()
 
         # Prepare report data summary
         report_data = {
-            "total_emissions": sum(e["total_co2e"] for e in emissions_data),
-            "emissions_count": len(emissions_data),
+            "total_emissions": sum(scope_totals.values()),
+            "emissions_count": emissions_count,
             "emissions_by_scope": {
-                "scope_1": sum(e["total_co2e"] for e in emissions_data if e.get("category") == "Scope 1"),
-                "scope_2": sum(e["total_co2e"] for e in emissions_data if e.get("category") == "Scope 2"),
-                "scope_3": sum(e["total_co2e"] for e in emissions_data if e.get("category") == "Scope 3")
+                "scope_1": scope_totals.get("Scope 1", 0),
+                "scope_2": scope_totals.get("Scope 2", 0),
+                "scope_3": scope_totals.get("Scope 3", 0)
             },
             "period": {
                 "start": request.period_start.isoformat(),
                 "end": request.period_end.isoformat()
             },
-            "organization": org_data["name"]
+            "organization": org_data["name"],
+            "data_hash": data_hash
         }
 
-        # Store report record in database
-        report = Report(
-            organization_id=org_id,
-            report_type=RT(request.report_type),
-            title=f"{request.report_type} Report - {request.period_start.strftime('%Y-%m-%d')} to {request.period_end.strftime('%Y-%m-%d')}",
-            description=request.description or f"Auto-generated {request.report_type} compliance report",
-            report_data=report_data,
-            file_path=s3_url,
-            period_start=request.period_start,
-            period_end=request.period_end,
-            status="completed"
-        )
-        db.add(report)
-        db.commit()
-        db.refresh(report)
+        # Reports are idempotent: if the latest report for the same period was
+        # built from the same data, return it instead of rendering a new PDF
+        report = db.query(Report).filter(
+            Report.organization_id == org_id,
+            Report.report_type == RT(request.report_type),
+            Report.period_start == request.period_start,
+            Report.period_end == request.period_end,
+            Report.status == "completed"
+        ).order_by(Report.created_at.desc()).first()
+
+        if report is None or (report.report_data or {}).get("data_hash") != data_hash:
+            # Generate report PDF in a worker thread; rendering is CPU-bound
+            # and would otherwise stall the event loop for its whole duration
+            generator = get_report_generator()
+            pdf_buffer = io.BytesIO()
+            await asyncio.to_thread(
+                generator.generate_gri_305_report,
+                org_data, emissions_data, request.period_start, request.period_end,
+                pdf_buffer
+            )
+            pdf_buffer.seek(0)
+
+            # Upload to S3 straight from the render buffer
+            s3_service = get_s3_service()
+            timestamp = utcnow().strftime("%Y%m%d_%H%M%S")
+            s3_key = f"reports/{org_id}/{request.report_type}_{timestamp}.pdf"
+            s3_url = await asyncio.to_thread(
+                s3_service.upload_fileobj,
+                fileobj=pdf_buffer,
+                key=s3_key,
+                metadata={
+                    "report_type": request.report_type,
+                    "organization_id": str(org_id)
+                }
+            )
+
+            # Store report record in database
+            report = Report(
+                organization_id=org_id,
+                report_type=RT(request.report_type),
+                title=f"{request.report_type} Report - {request.period_start.strftime('%Y-%m-%d')} to {request.period_end.strftime('%Y-%m-%d')}",
+                description=request.description or f"Auto-generated {request.report_type} compliance report",
+                report_data=report_data,
+                file_path=s3_url,
+                period_start=request.period_start,
+                period_end=request.period_end,
+                status="completed"
+            )
+            db.add(report)
+            db.commit()
 
         return {
             "id": report.id,
@@ -564,10 +830,10 @@ async def generate_report(request: ReportGenerationRequest, db: Session = Depend
             "report_type": report.report_type.value,
             "title": report.title,
             "file_path": report.file_path,
-            "period_start": report.period_start.isoformat(),
-            "period_end": report.period_end.isoformat(),
+            "period_start": report.period_start,
+            "period_end": report.period_end,
             "status": report.status,
-            "created_at": report.created_at.isoformat()
+            "created_at": report.created_at
         }
 
     except Exception as e:
@@ -582,9 +848,9 @@ async def list_reports(skip: int = 0, limit: int = 20, db: Session = Depends(get
     List all reports for an organization
     """
     from models.database import Report
-    org_id = 1  # Default organization
+    org_id = DEFAULT_ORG_ID
 
-    reports = db.query(Report).filter(Report.organization_id == org_id)\
+    reports = db.query(Report).options(raiseload('*')).filter(Report.organization_id == org_id)\
         .order_by(Report.created_at.desc()).offset(skip).limit(limit).all()
 
     return [
@@ -594,10 +860,10 @@ async def list_reports(skip: int = 0, limit: int = 20, db: Session = Depends(get
             "report_type": r.report_type.value,
             "title": r.title,
             "file_path": r.file_path,
-            "period_start": r.period_start.isoformat() if r.period_start else None,
-            "period_end": r.period_end.isoformat() if r.period_end else None,
+            "period_start": r.period_start,
+            "period_end": r.period_end,
             "status": r.status,
-            "created_at": r.created_at.isoformat() if r.created_at else None
+            "created_at": r.created_at
         }
         for r in reports
     ]
@@ -619,10 +885,10 @@ async def get_report(report_id: int, db: Session = Depends(get_db_session)):
         "report_type": report.report_type.value,
         "title": report.title,
         "file_path": report.file_path,
-        "period_start": report.period_start.isoformat() if report.period_start else None,
-        "period_end": report.period_end.isoformat() if report.period_end else None,
+        "period_start": report.period_start,
+        "period_end": report.period_end,
         "status": report.status,
-        "created_at": report.created_at.isoformat() if report.created_at else None
+        "created_at": report.created_at
     }
 
 
@@ -633,7 +899,6 @@ async def download_report(report_id: int, db: Session = Depends(get_db_session))
     """
     from models.database import Report
     from services.aws_services import get_s3_service
-    from fastapi.responses import Response
 
     report = db.query(Report).filter(Report.id == report_id).first()
     if not report:
@@ -644,15 +909,13 @@ async def download_report(report_id: int, db: Session = Depends(get_db_session))
 
     try:
         s3_service = get_s3_service()
-        pdf_bytes = s3_service.download_file(s3_key)
+        body, content_length = await asyncio.to_thread(s3_service.stream_file, s3_key)
 
-        return Response(
-            content=pdf_bytes,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={report.title.replace(' ', '_')}.pdf"
-            }
-        )
+        headers = {"Content-Disposition": f"attachment; filename={report.title.replace(' ', '_')}.pdf"}
+        if content_length is not None:
+            headers["Content-Length"] = str(content_length)
+
+        return StreamingResponse(body, media_type="application/pdf", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to download report: {str(e)}")
 
@@ -663,37 +926,59 @@ async def get_dashboard_stats(db: Session = Depends(get_db_session)):
     """
     Get dashboard statistics and overview from database
     """
-    from sqlalchemy import func, extract
+    from sqlalchemy import func, select, literal, union_all, Float, DateTime
     from datetime import datetime as dt
 
-    org_id = 1  # Default organization
+    org_id = DEFAULT_ORG_ID
+
+    # First day of each of the last 6 months, oldest first
+    now = utcnow()
+    year, month = now.year, now.month
+    months = []
+    for _ in range(6):
+        months.append(dt(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    months.reverse()
+
+    # Total bills, total emissions and the monthly emissions for the whole
+    # window are fetched in a single statement as (kpi, month, value) rows
+    month_bucket = func.date_trunc('month', Emission.period_start)
+    kpi_query = union_all(
+        select(
+            literal('total_bills').label('kpi'),
+            literal(None, DateTime).label('month'),
+            func.count(Bill.id).cast(Float).label('value')
+        ).where(Bill.organization_id == org_id),
+        select(
+            literal('total_emissions'),
+            literal(None, DateTime),
+            func.sum(Emission.total_co2e)
+        ).where(Emission.organization_id == org_id),
+        select(
+            literal('monthly_emissions'),
+            month_bucket,
+            func.sum(Emission.total_co2e)
+        ).where(
+            Emission.organization_id == org_id,
+            Emission.period_start >= months[0]
+        ).group_by(month_bucket)
+    )
 
-    # Total bills
-    total_bills = db.query(func.count(Bill.id)).filter(Bill.organization_id == org_id).scalar() or 0
+    total_bills = 0
+    total_emissions = 0
+    monthly_totals = {}
+    for kpi, bucket, value in db.execute(kpi_query):
+        if not value:
+            continue
+        if kpi == 'total_bills':
+            total_bills = int(value)
+        elif kpi == 'total_emissions':
+            total_emissions = float(value)
+        else:
+            monthly_totals[bucket] = float(value)
 
-    # Total emissions
-    total_emissions_result = db.query(func.sum(Emission.total_co2e)).filter(Emission.organization_id == org_id).scalar()
-    total_emissions = float(total_emissions_result) if total_emissions_result else 0
-
-    # Current month emissions
-    current_month = dt.utcnow().month
-    current_year = dt.utcnow().year
-    current_month_emissions_result = db.query(func.sum(Emission.total_co2e)).filter(
-        Emission.organization_id == org_id,
-        extract('month', Emission.period_start) == current_month,
-        extract('year', Emission.period_start) == current_year
-    ).scalar()
-    current_month_emissions = float(current_month_emissions_result) if current_month_emissions_result else 0
-
-    # Previous month emissions
-    prev_month = current_month - 1 if current_month > 1 else 12
-    prev_year = current_year if current_month > 1 else current_year - 1
-    previous_month_emissions_result = db.query(func.sum(Emission.total_co2e)).filter(
-        Emission.organization_id == org_id,
-        extract('month', Emission.period_start) == prev_month,
-        extract('year', Emission.period_start) == prev_year
-    ).scalar()
-    previous_month_emissions = float(previous_month_emissions_result) if previous_month_emissions_result else 0
+    current_month_emissions = monthly_totals.get(months[-1], 0)
+    previous_month_emissions = monthly_totals.get(months[-2], 0)
 
     # Emissions change percentage
     if previous_month_emissions > 0:
@@ -702,36 +987,33 @@ async def get_dashboard_stats(db: Session = Depends(get_db_session)):
         emissions_change = 0
 
     # Recent bills
-    recent_bills_query = db.query(Bill).filter(Bill.organization_id == org_id).order_by(Bill.created_at.desc()).limit(5).all()
+    recent_bills_query = db.query(Bill).options(raiseload('*')).filter(Bill.organization_id == org_id).order_by(Bill.created_at.desc()).limit(5).all()
+    # Database rows are already valid, so build the response models without
+    # validation; FastAPI validates the whole response once on the way out
     recent_bills = [
-        BillResponse(
+        BillResponse.model_construct(
             id=bill.id,
             organization_id=bill.organization_id,
             file_name=bill.file_name,
-            bill_type=bill.bill_type.value,
-            status=bill.status.value,
+            bill_type=BillTypeEnum(bill.bill_type.value),
+            status=BillStatusEnum(bill.status.value),
             extracted_data=bill.extracted_data or {},
             created_at=bill.created_at,
-            processed_at=bill.created_at
+            processed_at=bill.processed_at
         )
         for bill in recent_bills_query
     ]
 
     # Emissions by month (last 6 months)
-    emissions_by_month = []
-    for i in range(5, -1, -1):
-        month_date = dt(current_year, current_month, 1) - timedelta(days=30 * i)
-        month_emissions = db.query(func.sum(Emission.total_co2e)).filter(
-            Emission.organization_id == org_id,
-            extract('month', Emission.period_start) == month_date.month,
-            extract('year', Emission.period_start) == month_date.year
-        ).scalar()
-        emissions_by_month.append({
-            "month": month_date.strftime("%b %Y"),
-            "emissions": float(month_emissions) if month_emissions else 0
-        })
+    emissions_by_month = [
+        {
+            "month": month_start.strftime("%b %Y"),
+            "emissions": monthly_totals.get(month_start, 0)
+        }
+        for month_start in months
+    ]
 
-    return DashboardStats(
+    return DashboardStats.model_construct(
         total_bills=total_bills,
         total_emissions=total_emissions,
         current_month_emissions=current_month_emissions,
@@ -749,20 +1031,28 @@ async def get_compliance_status(db: Session = Depends(get_db_session)):
     """
     Get current compliance status with automated checks
     """
-    from sqlalchemy import func
-    org_id = 1  # Default organization
-
-    # Get total emissions
-    total_emissions = db.query(func.sum(Emission.total_co2e)).filter(
-        Emission.organization_id == org_id
-    ).scalar() or 0
-
-    # Get bills count
-    bills_count = db.query(func.count(Bill.id)).filter(
-        Bill.organization_id == org_id
-    ).scalar() or 0
+    from sqlalchemy import func, select, exists
+    from models.database import BillStatus
+    org_id = DEFAULT_ORG_ID
+
+    # Everything the checks need in a single round-trip: bill counts via
+    # conditional aggregation, emission figures as uncorrelated subqueries
+    bills_count, recent_bills, total_emissions, has_scope2 = db.query(
+        func.count(Bill.id),
+        func.count(Bill.id).filter(Bill.status == BillStatus.VALIDATED),
+        select(func.sum(Emission.total_co2e)).where(
+            Emission.organization_id == org_id
+        ).scalar_subquery(),
+        exists().where(
+            Emission.organization_id == org_id,
+            Emission.category == "Scope 2"
+        )
+    ).filter(Bill.organization_id == org_id).one()
+    total_emissions = total_emissions or 0
+    has_scope2 = bool(has_scope2)
 
     # Define compliance rules and check them
+    checked_at = utcnow().isoformat()
     checks = []
 
     # GRI Standards - Check if we have emission data
@@ -771,35 +1061,25 @@ async def get_compliance_status(db: Session = Depends(get_db_session)):
         "regulation": "GRI Standards",
         "is_compliant": total_emissions > 0 and bills_count > 0,
         "details": f"Organization has {bills_count} bills processed and {total_emissions:.2f} kg CO2e calculated",
-        "checked_at": datetime.utcnow().isoformat()
+        "checked_at": checked_at
     })
 
     # ISO 14064 - Greenhouse gas accounting
-    has_scope2 = db.query(Emission).filter(
-        Emission.organization_id == org_id,
-        Emission.category == "Scope 2"
-    ).first() is not None
-
     checks.append({
         "rule_name": "ISO 14064 - GHG Accounting",
         "regulation": "ISO 14064",
         "is_compliant": has_scope2,
         "details": "Scope 2 emissions are being tracked" if has_scope2 else "Need to track Scope 2 emissions",
-        "checked_at": datetime.utcnow().isoformat()
+        "checked_at": checked_at
     })
 
     # CDP Requirements - Check data completeness
-    recent_bills = db.query(Bill).filter(
-        Bill.organization_id == org_id,
-        Bill.status == "validated"
-    ).count()
-
     checks.append({
         "rule_name": "CDP - Data Completeness",
         "regulation": "Carbon Disclosure Project",
         "is_compliant": recent_bills >= 3,
         "details": f"{recent_bills} validated bills (minimum 3 required for quarterly reporting)",
-        "checked_at": datetime.utcnow().isoformat()
+        "checked_at": checked_at
     })
 
     # UAE Carbon Regulations - Emissions threshold
@@ -809,7 +1089,7 @@ async def get_compliance_status(db: Session = Depends(get_db_session)):
         "regulation": "UAE Environmental",
         "is_compliant": True,  # Always compliant for demo
         "details": f"Current emissions: {emissions_tonnes:.3f} tonnes CO2e (below 100t threshold)",
-        "checked_at": datetime.utcnow().isoformat()
+        "checked_at": checked_at
     })
 
     # Calculate overall compliance
@@ -819,7 +1099,7 @@ async def get_compliance_status(db: Session = Depends(get_db_session)):
     return {
         "overall_compliant": overall_compliant,
         "checks": checks,
-        "checked_at": datetime.utcnow().isoformat(),
+        "checked_at": checked_at,
         "summary": {
             "total_checks": len(checks),
             "compliant": compliant_checks,
@@ -828,6 +1108,96 @@ async def get_compliance_status(db: Session = Depends(get_db_session)):
     }
 
 
+# Project pricing (mock marketplace data - in real implementation, fetch from carbon marketplace API)
+def orjson_default(value):
+    """Encode types orjson does not handle natively"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def orjson_response(payload, status_code: int = 200) -> Response:
+    """
+    Serialize a payload straight to JSON bytes. Returning a Response
+    skips FastAPI's jsonable_encoder pass over every item.
+    """
+    return Response(
+        content=orjson.dumps(payload, default=orjson_default),
+        status_code=status_code,
+        media_type="application/json"
+    )
+
+
+# Read-only so request handlers can't mutate the shared price table
+PROJECT_PRICES: Mapping[str, int] = MappingProxyType({
+    "renewable_energy": 25,  # USD per tonne CO2e
+    "nature_based": 30,
+    "industrial": 22,
+    "forestry": 28,
+    "carbon_capture": 35
+})
+
+
+# Per-source emission totals for carbon credit estimates, keyed by org,
+# period and the org's emissions version. Recording new emissions bumps
+# the version so this process never serves totals that predate them; the
+# TTL bounds staleness for emissions recorded by other processes.
+_ESTIMATE_CACHE = TTLCache(maxsize=512, ttl=60)
+_EMISSIONS_VERSION = defaultdict(int)
+
+
+# Offset projects offered with every estimate; built once at import
+AVAILABLE_PROJECTS = (
+    {
+        "type": "renewable_energy",
+        "name": "UAE Solar Energy Project",
+        "location": "Dubai, UAE",
+        "price_per_tonne": 25,
+        "certification": "Gold Standard"
+    },
+    {
+        "type": "nature_based",
+        "name": "Mangrove Restoration",
+        "location": "Abu Dhabi, UAE",
+        "price_per_tonne": 30,
+        "certification": "Verified Carbon Standard"
+    },
+    {
+        "type": "renewable_energy",
+        "name": "Wind Energy Farm",
+        "location": "Oman",
+        "price_per_tonne": 22,
+        "certification": "Gold Standard"
+    }
+)
+
+
+# Above this many rows, list totals come from the planner's estimate
+APPROX_COUNT_THRESHOLD = 10000
+
+# Carbon credit row count per org, seeded by exact first-page counts and
+# planner estimates, so later pages don't pay for a count of their own.
+# Purchases drop their org's entry; the TTL bounds staleness otherwise.
+_CREDIT_TOTAL_CACHE = TTLCache(maxsize=1024, ttl=300)
+
+
+def estimate_row_count(db: Session, query) -> Optional[int]:
+    """
+    Read the planner's row estimate for a query from EXPLAIN, without
+    running it. Returns None on databases other than PostgreSQL.
+    """
+    dialect = db.get_bind().dialect
+    if dialect.name != "postgresql":
+        return None
+
+    # Values stay bound parameters rather than being rendered into the SQL
+    compiled = query.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    plan = db.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
 # Carbon credits endpoints
 @app.post("/api/carbon-credits/estimate")
 async def estimate_carbon_credits(
@@ -840,20 +1210,35 @@ async def estimate_carbon_credits(
     """
     Estimate potential carbon credits needed for offsetting emissions
     """
-    org_id = 1  # TODO: Get from authentication
+    from sqlalchemy import func
 
-    # Query emissions for the specified period
-    emissions = db.query(Emission).filter(
-        Emission.organization_id == org_id,
-        Emission.period_start >= period_start,
-        Emission.period_end <= period_end
-    ).all()
+    org_id = DEFAULT_ORG_ID  # TODO: Get from authentication
+
+    cache_key = (org_id, period_start, period_end, _EMISSIONS_VERSION[org_id])
+    source_breakdown = _ESTIMATE_CACHE.get(cache_key)
 
-    if not emissions:
-        raise HTTPException(status_code=404, detail="No emissions found for the specified period")
+    if source_breakdown is None:
+        # Per-source totals for the specified period, aggregated in SQL
+        source_rows = db.query(
+            Emission.source_type,
+            func.sum(Emission.total_co2e)
+        ).filter(
+            Emission.organization_id == org_id,
+            Emission.period_start >= period_start,
+            Emission.period_end <= period_end
+        ).group_by(Emission.source_type).all()
+
+        if not source_rows:
+            raise HTTPException(status_code=404, detail="No emissions found for the specified period")
+
+        source_breakdown = {
+            (source.value if source else "unknown"): float(total or 0)
+            for source, total in source_rows
+        }
+        _ESTIMATE_CACHE[cache_key] = source_breakdown
 
     # Calculate total emissions in kg CO2e
-    total_co2e_kg = sum(e.total_co2e for e in emissions)
+    total_co2e_kg = sum(source_breakdown.values())
 
     # Convert to tonnes
     total_co2e_tonnes = total_co2e_kg / 1000
@@ -861,27 +1246,10 @@ async def estimate_carbon_credits(
     # Calculate credits needed based on offset percentage
     credits_needed_tonnes = total_co2e_tonnes * (offset_percentage / 100)
 
-    # Project pricing (mock marketplace data - in real implementation, fetch from carbon marketplace API)
-    project_prices = {
-        "renewable_energy": 25,  # USD per tonne CO2e
-        "nature_based": 30,
-        "industrial": 22,
-        "forestry": 28,
-        "carbon_capture": 35
-    }
-
-    price_per_tonne = project_prices.get(project_type, 25)
+    price_per_tonne = PROJECT_PRICES.get(project_type, 25)
     estimated_cost_usd = credits_needed_tonnes * price_per_tonne
 
-    # Calculate breakdown by emission source
-    source_breakdown = {}
-    for emission in emissions:
-        source = emission.source_type.value if emission.source_type else "unknown"
-        if source not in source_breakdown:
-            source_breakdown[source] = 0
-        source_breakdown[source] += emission.total_co2e
-
-    return {
+    return orjson_response({
         "total_emissions_kg": round(total_co2e_kg, 2),
         "total_emissions_tonnes": round(total_co2e_tonnes, 4),
         "offset_percentage": offset_percentage,
@@ -889,73 +1257,110 @@ async def estimate_carbon_credits(
         "project_type": project_type,
         "price_per_tonne_usd": price_per_tonne,
         "estimated_cost_usd": round(estimated_cost_usd, 2),
-        "period_start": period_start.isoformat(),
-        "period_end": period_end.isoformat(),
+        "period_start": period_start,
+        "period_end": period_end,
         "emission_sources": source_breakdown,
-        "available_projects": [
-            {
-                "type": "renewable_energy",
-                "name": "UAE Solar Energy Project",
-                "location": "Dubai, UAE",
-                "price_per_tonne": 25,
-                "certification": "Gold Standard"
-            },
-            {
-                "type": "nature_based",
-                "name": "Mangrove Restoration",
-                "location": "Abu Dhabi, UAE",
-                "price_per_tonne": 30,
-                "certification": "Verified Carbon Standard"
-            },
-            {
-                "type": "renewable_energy",
-                "name": "Wind Energy Farm",
-                "location": "Oman",
-                "price_per_tonne": 22,
-                "certification": "Gold Standard"
-            }
-        ]
-    }
+        "available_projects": AVAILABLE_PROJECTS
+    })
 
 
 @app.get("/api/carbon-credits")
 async def list_carbon_credits(
     skip: int = 0,
     limit: int = 50,
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
     db: Session = Depends(get_db_session)
 ):
     """
-    List carbon credit purchase records
+    List carbon credit purchase records.
+    Pass the returned `next_cursor` values as `before` and `before_id` to
+    page by cursor instead of offset.
     """
-    org_id = 1  # TODO: Get from authentication
-
-    # Query carbon credits from database
-    credits = db.query(CarbonCredit).filter(
-        CarbonCredit.organization_id == org_id
-    ).order_by(CarbonCredit.created_at.desc()).offset(skip).limit(limit).all()
+    from sqlalchemy import select, func, literal, tuple_
+
+    org_id = DEFAULT_ORG_ID  # TODO: Get from authentication
+
+    # Query the page and the org's total in one round trip; every row
+    # carries the total as a column. The first page counts exactly with a
+    # window. Later pages take the org's cached or estimated total when it
+    # is too large to count; otherwise a scalar subquery counts exactly,
+    # since a cursor narrows the rows the window sees.
+    first_page = before is None and not skip
+    known_total = None
+    if not first_page:
+        known_total = _CREDIT_TOTAL_CACHE.get(org_id)
+        if known_total is None:
+            known_total = estimate_row_count(
+                db, select(CarbonCredit.id).where(CarbonCredit.organization_id == org_id)
+            )
+            if known_total is not None:
+                _CREDIT_TOTAL_CACHE[org_id] = known_total
+    total_is_estimate = known_total is not None and known_total > APPROX_COUNT_THRESHOLD
+
+    if first_page:
+        total_column = func.count().over()
+    elif total_is_estimate:
+        total_column = literal(known_total)
+    else:
+        total_column = select(func.count(CarbonCredit.id)).where(
+            CarbonCredit.organization_id == org_id
+        ).scalar_subquery()
+
+    # Select only the columns we return, skipping ORM instance construction
+    query = select(
+        CarbonCredit.id,
+        CarbonCredit.project_name,
+        CarbonCredit.project_type,
+        CarbonCredit.credits_amount,
+        CarbonCredit.price_per_credit,
+        CarbonCredit.total_cost,
+        CarbonCredit.purchase_date,
+        CarbonCredit.status,
+        CarbonCredit.certificate_url,
+        CarbonCredit.retirement_date,
+        CarbonCredit.created_at,
+        total_column.label("total")
+    ).where(CarbonCredit.organization_id == org_id)
+    # id breaks created_at ties (a bulk purchase shares one timestamp), so
+    # rows sharing the last timestamp of a page are not skipped
+    if before is not None and before_id is not None:
+        query = query.where(tuple_(CarbonCredit.created_at, CarbonCredit.id) < tuple_(before, before_id))
+    elif before is not None:
+        query = query.where(CarbonCredit.created_at < before)
+
+    rows = db.execute(
+        query.order_by(CarbonCredit.created_at.desc(), CarbonCredit.id.desc()).offset(skip).limit(limit)
+    ).all()
 
-    total = db.query(func.count(CarbonCredit.id)).filter(
-        CarbonCredit.organization_id == org_id
-    ).scalar()
+    if rows:
+        total = rows[0].total
+        if first_page:
+            _CREDIT_TOTAL_CACHE[org_id] = total
+    elif total_is_estimate:
+        total = known_total
+    elif not first_page:
+        # Paged past the end, so no row carried the total
+        total = db.query(func.count(CarbonCredit.id)).filter(
+            CarbonCredit.organization_id == org_id
+        ).scalar()
+    else:
+        total = 0
 
-    return {
-        "items": [{
-            "id": c.id,
-            "project_name": c.project_name,
-            "project_type": c.project_type,
-            "credits_amount": c.credits_amount,
-            "price_per_credit": c.price_per_credit,
-            "total_cost": c.total_cost,
-            "purchase_date": c.purchase_date.isoformat() if c.purchase_date else None,
-            "status": c.status,
-            "certificate_url": c.certificate_url,
-            "retirement_date": c.retirement_date.isoformat() if c.retirement_date else None,
-            "created_at": c.created_at.isoformat()
-        } for c in credits],
+    return orjson_response({
+        "items": [
+            {key: value for key, value in row._mapping.items() if key != "total"}
+            for row in rows
+        ],
         "total": total,
         "skip": skip,
-        "limit": limit
-    }
+        "limit": limit,
+        "total_is_estimate": total_is_estimate,
+        "next_cursor": (
+            {"before": rows[-1].created_at, "before_id": rows[-1].id}
+            if len(rows) == limit else None
+        )
+    })
 
 
 @app.post("/api/carbon-credits/purchase")
@@ -969,7 +1374,7 @@ async def purchase_carbon_credits(
     """
     Record a carbon credit purchase
     """
-    org_id = 1  # TODO: Get from authentication
+    org_id = DEFAULT_ORG_ID  # TODO: Get from authentication
 
     total_cost = credits_amount * price_per_credit
 
@@ -981,17 +1386,19 @@ async def purchase_carbon_credits(
         credits_amount=credits_amount,
         price_per_credit=price_per_credit,
         total_cost=total_cost,
-        purchase_date=datetime.now(),
+        purchase_date=utcnow(),
         status="active",
         certificate_url=None,  # TODO: Generate or receive certificate URL
         retirement_date=None
     )
 
+    # The id is populated by the commit's flush and every other field was
+    # set here, so nothing needs to be reloaded from the database
     db.add(credit)
     db.commit()
-    db.refresh(credit)
+    _CREDIT_TOTAL_CACHE.pop(org_id, None)
 
-    return {
+    return orjson_response({
         "success": True,
         "message": "Carbon credits purchased successfully",
         "credit": {
@@ -1000,10 +1407,66 @@ async def purchase_carbon_credits(
             "project_type": credit.project_type,
             "credits_amount": credit.credits_amount,
             "total_cost": credit.total_cost,
-            "purchase_date": credit.purchase_date.isoformat(),
+            "purchase_date": credit.purchase_date,
             "status": credit.status
         }
-    }
+    })
+
+
+@app.post("/api/carbon-credits/purchase/bulk")
+async def purchase_carbon_credits_bulk(
+    credits: List[CarbonCreditPurchase],
+    db: Session = Depends(get_db_session)
+):
+    """
+    Record several carbon credit purchases in one request
+    """
+    from sqlalchemy import insert
+
+    if not credits:
+        raise HTTPException(status_code=400, detail="No carbon credits to purchase")
+
+    org_id = DEFAULT_ORG_ID  # TODO: Get from authentication
+
+    purchase_date = utcnow()
+    values = [
+        {
+            "organization_id": org_id,
+            "project_name": c.project_name,
+            "project_type": c.project_type,
+            "credits_amount": c.credits_amount,
+            "price_per_credit": c.price_per_credit,
+            "total_cost": c.credits_amount * c.price_per_credit,
+            "purchase_date": purchase_date,
+            "status": "active"
+        }
+        for c in credits
+    ]
+
+    # All rows go out as one batched INSERT ... RETURNING id
+    ids = db.scalars(
+        insert(CarbonCredit).returning(CarbonCredit.id, sort_by_parameter_order=True),
+        values
+    ).all()
+    db.commit()
+    _CREDIT_TOTAL_CACHE.pop(org_id, None)
+
+    return orjson_response({
+        "success": True,
+        "message": f"{len(values)} carbon credit purchases recorded",
+        "credits": [
+            {
+                "id": credit_id,
+                "project_name": v["project_name"],
+                "project_type": v["project_type"],
+                "credits_amount": v["credits_amount"],
+                "total_cost": v["total_cost"],
+                "purchase_date": v["purchase_date"],
+                "status": v["status"]
+            }
+            for credit_id, v in zip(ids, values)
+        ]
+    })
 
 
 # Analytics endpoints
@@ -1027,28 +1490,39 @@ async def get_analytics_trends(
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
-        content=ErrorResponse(
+        content=ErrorResponse.model_construct(
             error=exc.detail,
             detail=str(exc)
-        ).dict()
+        ).model_dump()
     )
 
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
-        content=ErrorResponse(
+        content=ErrorResponse.model_construct(
             error="Internal server error",
             detail=str(exc)
-        ).dict()
+        ).model_dump()
     )
 
 
 # Lambda handler (for AWS deployment)
-handler = Mangum(app)
+asgi_handler = Mangum(app)
+
+
+def handler(event, context):
+    """Run queued bill extractions directly; everything else goes to the API"""
+    if event.get("task") == "process_bill_extraction":
+        import models.database as database
+        if database.SessionLocal is None:
+            init_db()
+        process_bill_extraction(event["bill_id"], event["s3_key"], event.get("bill_type"))
+        return {"bill_id": event["bill_id"]}
+    return asgi_handler(event, context)
 
 
 if __name__ == "__main__":
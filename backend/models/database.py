@@ -1,15 +1,20 @@
 """
 Database models for Eco-Accounting SaaS
 """
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Enum, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, Enum, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from datetime import datetime
+from datetime import datetime, timezone
 import enum
 
 Base = declarative_base()
 
 
+def utcnow():
+    """Current time as a timezone-aware UTC datetime"""
+    return datetime.now(timezone.utc)
+
+
 class BillType(str, enum.Enum):
     ELECTRICITY = "electricity"
     WATER = "water"
@@ -44,8 +49,8 @@ class Organization(Base):
     country = Column(String(100))
     region = Column(String(100))
     cognito_user_pool_id = Column(String(255))
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
 
     # Relationships
     users = relationship("User", back_populates="organization")
@@ -64,8 +69,8 @@ class User(Base):
     role = Column(String(50), default="user")
     organization_id = Column(Integer, ForeignKey("organizations.id"))
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    last_login = Column(DateTime)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    last_login = Column(DateTime(timezone=True))
 
     # Relationships
     organization = relationship("Organization", back_populates="users")
@@ -98,14 +103,19 @@ class Bill(Base):
     error_message = Column(Text)
 
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
-    processed_at = Column(DateTime)
-    validated_at = Column(DateTime)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    processed_at = Column(DateTime(timezone=True))
+    validated_at = Column(DateTime(timezone=True))
 
     # Relationships
     organization = relationship("Organization", back_populates="bills")
     emission = relationship("Emission", back_populates="bill", uselist=False)
 
+    # Org-scoped listings are ordered newest first
+    __table_args__ = (
+        Index("ix_bills_org_created", "organization_id", created_at.desc(), id.desc()),
+    )
+
 
 class Emission(Base):
     __tablename__ = "emissions"
@@ -138,12 +148,17 @@ class Emission(Base):
     # Metadata
     calculation_method = Column(String(255))
     notes = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
 
     # Relationships
     organization = relationship("Organization", back_populates="emissions")
     bill = relationship("Bill", back_populates="emission")
 
+    # Org-scoped listings are ordered newest first
+    __table_args__ = (
+        Index("ix_emissions_org_created", "organization_id", created_at.desc(), id.desc()),
+    )
+
 
 class Report(Base):
     __tablename__ = "reports"
@@ -168,8 +183,8 @@ class Report(Base):
     generated_by = Column(String(255))  # Cognito sub
     status = Column(String(50), default="draft")
     version = Column(Integer, default=1)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    published_at = Column(DateTime)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    published_at = Column(DateTime(timezone=True))
 
     # Relationships
     organization = relationship("Organization", back_populates="reports")
@@ -198,7 +213,7 @@ class ComplianceRule(Base):
     effective_date = Column(DateTime)
     expiry_date = Column(DateTime)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
 
 
 class ComplianceCheck(Base):
@@ -215,7 +230,7 @@ class ComplianceCheck(Base):
     deviation = Column(Float)  # Percentage or absolute deviation
 
     # Details
-    check_date = Column(DateTime, default=datetime.utcnow)
+    check_date = Column(DateTime(timezone=True), default=utcnow)
     period_start = Column(DateTime)
     period_end = Column(DateTime)
     notes = Column(Text)
@@ -227,41 +242,150 @@ class CarbonCredit(Base):
     id = Column(Integer, primary_key=True, index=True)
     organization_id = Column(Integer, ForeignKey("organizations.id"), nullable=False)
 
-    # Credit details
-    baseline_emissions = Column(Float, nullable=False)  # kg CO2e
-    actual_emissions = Column(Float, nullable=False)  # kg CO2e
-    avoided_emissions = Column(Float, nullable=False)  # kg CO2e
+    # Credit details (estimates only; purchases leave these empty)
+    baseline_emissions = Column(Float)  # kg CO2e
+    actual_emissions = Column(Float)  # kg CO2e
+    avoided_emissions = Column(Float)  # kg CO2e
 
     # Credit calculation
-    potential_credits = Column(Float, nullable=False)  # tonnes CO2e
+    potential_credits = Column(Float)  # tonnes CO2e
     credit_price = Column(Float)  # USD per tonne
     potential_value = Column(Float)  # USD
 
     # Project details
+    project_name = Column(String(255))
     project_type = Column(String(255))  # e.g., "Energy Efficiency", "Renewable Energy"
     methodology = Column(String(255))
 
+    # Purchase details
+    credits_amount = Column(Float)  # tonnes CO2e
+    price_per_credit = Column(Float)  # USD per tonne
+    total_cost = Column(Float)  # USD
+    purchase_date = Column(DateTime(timezone=True))
+    certificate_url = Column(String(500))
+    retirement_date = Column(DateTime(timezone=True))
+
     # Time period
-    period_start = Column(DateTime, nullable=False)
-    period_end = Column(DateTime, nullable=False)
+    period_start = Column(DateTime)
+    period_end = Column(DateTime)
 
     # Status
     status = Column(String(50), default="estimated")  # estimated, verified, issued
-    verification_date = Column(DateTime)
+    verification_date = Column(DateTime(timezone=True))
     notes = Column(Text)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+
+    # Org-scoped listings are ordered newest first
+    __table_args__ = (
+        Index("ix_carbon_credits_org_created", "organization_id", created_at.desc(), id.desc()),
+    )
 
 
 import os
 from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool, QueuePool
 
 load_dotenv()
 
+# Connection pool sizing for long-running servers. Connections are
+# recycled before RDS/proxy idle timeouts and pinged on checkout so a
+# stale one is replaced instead of failing the request.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '300'))
+
+# Schema creation runs at deploy time (python -m models.database); set this
+# to also create missing tables whenever the app connects, e.g. locally
+RUN_MIGRATIONS = os.getenv('RUN_MIGRATIONS', '').lower() in ('1', 'true', 'yes')
+
 # Global engine and session factory
 engine = None
 SessionLocal = None
 
+# create_all only creates missing tables, so model changes to existing
+# tables are applied by these PostgreSQL statements after it. Each one is
+# idempotent and they run in order on every deploy.
+_KEYSET_INDEX_UPGRADE = """
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE indexname = 'ix_{table}_org_created'
+          AND strpos(indexdef, 'created_at DESC, id DESC') > 0
+    ) THEN
+        DROP INDEX IF EXISTS ix_{table}_org_created;
+        CREATE INDEX ix_{table}_org_created ON {table} (organization_id, created_at DESC, id DESC);
+    END IF;
+END $$
+"""
+
+# Converts whichever of a table's listed columns are still naive in a single
+# table rewrite; stored values are UTC wall times
+_TIMESTAMPTZ_UPGRADE = """
+DO $$
+DECLARE
+    alterations text;
+BEGIN
+    SELECT string_agg(
+        'ALTER COLUMN ' || quote_ident(column_name) || ' TYPE timestamptz USING '
+            || quote_ident(column_name) || ' AT TIME ZONE ''UTC''',
+        ', '
+    ) INTO alterations
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+      AND table_name = '{table}'
+      AND column_name IN ({columns})
+      AND data_type = 'timestamp without time zone';
+
+    IF alterations IS NOT NULL THEN
+        EXECUTE 'ALTER TABLE {table} ' || alterations;
+    END IF;
+END $$
+"""
+
+_TIMESTAMPTZ_COLUMNS = {
+    "organizations": ("created_at", "updated_at"),
+    "users": ("created_at", "last_login"),
+    "bills": ("created_at", "processed_at", "validated_at"),
+    "emissions": ("created_at",),
+    "reports": ("created_at", "published_at"),
+    "compliance_rules": ("created_at",),
+    "compliance_checks": ("check_date",),
+    "carbon_credits": ("created_at", "purchase_date", "retirement_date", "verification_date"),
+}
+
+SCHEMA_UPGRADES = [
+    # Keyset pagination indexes gained id as a tie-breaker
+    *(_KEYSET_INDEX_UPGRADE.format(table=table) for table in ("bills", "emissions", "carbon_credits")),
+    # Carbon credit purchase details
+    """
+    ALTER TABLE carbon_credits
+        ADD COLUMN IF NOT EXISTS project_name VARCHAR(255),
+        ADD COLUMN IF NOT EXISTS credits_amount DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS price_per_credit DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS total_cost DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS purchase_date TIMESTAMP,
+        ADD COLUMN IF NOT EXISTS certificate_url VARCHAR(500),
+        ADD COLUMN IF NOT EXISTS retirement_date TIMESTAMP
+    """,
+    # Purchases leave the estimate-only columns empty
+    """
+    ALTER TABLE carbon_credits
+        ALTER COLUMN baseline_emissions DROP NOT NULL,
+        ALTER COLUMN actual_emissions DROP NOT NULL,
+        ALTER COLUMN avoided_emissions DROP NOT NULL,
+        ALTER COLUMN potential_credits DROP NOT NULL,
+        ALTER COLUMN period_start DROP NOT NULL,
+        ALTER COLUMN period_end DROP NOT NULL
+    """,
+    # Record timestamps became timezone-aware UTC
+    *(
+        _TIMESTAMPTZ_UPGRADE.format(table=table, columns=", ".join(f"'{column}'" for column in columns))
+        for table, columns in _TIMESTAMPTZ_COLUMNS.items()
+    ),
+]
+
 
 def get_database_url():
     """Get database URL from environment"""
@@ -283,22 +407,61 @@ def get_database_url():
 
 
 def init_db():
-    """Initialize database connection and create tables"""
+    """Initialize database connection, creating tables if RUN_MIGRATIONS is set"""
     global engine, SessionLocal
 
     database_url = get_database_url()
-    engine = create_engine(database_url, echo=False)
-    Base.metadata.create_all(bind=engine)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    if os.getenv('AWS_LAMBDA_FUNCTION_NAME'):
+        # On Lambda (Mangum) each container handles one request at a time
+        # and may be frozen or discarded between invocations, so a pool
+        # would only hold connections the database can't reclaim
+        engine = create_engine(database_url, echo=False, poolclass=NullPool)
+    else:
+        engine = create_engine(
+            database_url,
+            echo=False,
+            poolclass=QueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+            pool_use_lifo=True
+        )
+    if RUN_MIGRATIONS:
+        Base.metadata.create_all(bind=engine)
+        upgrade_schema()
+    # Sessions live for one request, so loaded and freshly inserted objects
+    # stay usable after commit instead of being expired and reloaded
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
     return engine
 
 
-def get_db_session():
-    """Get database session (dependency for FastAPI)"""
-    if SessionLocal is None:
+def upgrade_schema():
+    """Bring existing PostgreSQL tables up to date with the models"""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.exec_driver_sql(statement)
+
+
+def create_tables():
+    """Create any missing tables and upgrade existing ones (deploy-time step)"""
+    if engine is None:
         init_db()
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+
+
+def get_db_session():
+    """Get database session (dependency for FastAPI); init_db runs at startup"""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+if __name__ == "__main__":
+    create_tables()
+    print("✅ Database tables created and upgraded")
@@ -215,6 +215,13 @@ class CarbonCreditEstimateRequest(BaseModel):
     project_type: str
 
 
+class CarbonCreditPurchase(BaseModel):
+    project_name: str
+    project_type: str
+    credits_amount: float = Field(gt=0)
+    price_per_credit: float = Field(ge=0)
+
+
 class CarbonCreditResponse(BaseModel):
     id: int
     baseline_emissions: float
@@ -2,14 +2,29 @@
 Authentication service using AWS Cognito
 """
 
+import asyncio
 import os
+import hashlib
+import threading
+from functools import lru_cache
 import boto3
 import jwt
+from cachetools import TTLCache
 from typing import Optional, Dict
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from botocore.exceptions import ClientError
+from services.aws_services import BOTO_CONFIG
+
+
+@lru_cache(maxsize=64)
+def _token_kid(header_segment: str) -> Optional[str]:
+    """
+    Key ID from a JWT's (unverified) header segment. Every token signed
+    with the same key shares this segment, so it is parsed once per key.
+    """
+    return jwt.get_unverified_header(f"{header_segment}..").get('kid')
 
 
 class CognitoAuth:
@@ -20,10 +35,21 @@ class CognitoAuth:
         self.client_secret = os.getenv('COGNITO_CLIENT_SECRET')
 
         # Initialize Cognito client
-        self.cognito_client = boto3.client('cognito-idp', region_name=self.region)
+        self.cognito_client = boto3.client('cognito-idp', region_name=self.region, config=BOTO_CONFIG)
 
-        # JWT verification keys
-        self.jwks_url = f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}/.well-known/jwks.json"
+        # JWT verification keys, fetched once and cached until rotation
+        self.issuer = f"https://cognito-idp.{self.region}.amazonaws.com/{self.user_pool_id}"
+        self.jwks_url = f"{self.issuer}/.well-known/jwks.json"
+        self._jwk_client = jwt.PyJWKClient(self.jwks_url, cache_keys=True, lifespan=3600)
+
+        # Authenticated users keyed by the SHA-256 of their token, so raw
+        # tokens are never held in memory. Expiry is re-checked on every hit.
+        self._token_cache = TTLCache(maxsize=10000, ttl=300)
+        self._token_cache_lock = threading.Lock()
+
+    @staticmethod
+    def _token_key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
 
     def sign_up(self, email: str, password: str, full_name: str) -> Dict:
         """
@@ -124,27 +150,71 @@ class CognitoAuth:
 
     def verify_token(self, token: str) -> Dict:
         """
-        Verify and decode JWT token
+        Verify and decode JWT token against the user pool's signing keys
         """
         try:
-            # Decode without verification first to get header
-            unverified_headers = jwt.get_unverified_header(token)
-
-            # In production, fetch and cache JWKS keys from Cognito
-            # For now, decode without verification (NOT PRODUCTION READY)
+            signing_key = self._jwk_client.get_signing_key(_token_kid(token.split('.', 1)[0]))
             decoded = jwt.decode(
                 token,
-                options={"verify_signature": False}  # TODO: Add proper verification in production
+                signing_key.key,
+                algorithms=['RS256'],
+                issuer=self.issuer,
+                options={'require': ['exp', 'iat'], 'verify_aud': False}
             )
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token has expired")
+        except (jwt.InvalidTokenError, jwt.PyJWKClientError):
+            raise HTTPException(status_code=401, detail="Invalid token")
 
-            # Verify token expiration
-            if decoded.get('exp', 0) < datetime.now().timestamp():
-                raise HTTPException(status_code=401, detail="Token has expired")
-
-            return decoded
-        except jwt.InvalidTokenError as e:
+        # ID tokens carry the app client in 'aud', access tokens in 'client_id'
+        if decoded.get('aud', decoded.get('client_id')) != self.client_id:
             raise HTTPException(status_code=401, detail="Invalid token")
 
+        return decoded
+
+    def get_cached_user(self, token: str) -> Optional[Dict]:
+        """
+        Return the cached user for an already-verified token, or None
+        """
+        key = self._token_key(token)
+
+        with self._token_cache_lock:
+            current_user = self._token_cache.get(key)
+
+        if current_user is not None and current_user['token_claims'].get('exp', 0) < datetime.now().timestamp():
+            with self._token_cache_lock:
+                self._token_cache.pop(key, None)
+            raise HTTPException(status_code=401, detail="Token has expired")
+        return current_user
+
+    def authenticate(self, token: str) -> Dict:
+        """
+        Verify a token and return its user, from cache when possible
+        """
+        current_user = self.get_cached_user(token)
+        if current_user is not None:
+            return current_user
+
+        # Verify and decode token; the user comes straight from its claims.
+        # Use get_user_info when live Cognito attributes are needed.
+        current_user = self.user_from_claims(self.verify_token(token))
+        with self._token_cache_lock:
+            self._token_cache[self._token_key(token)] = current_user
+        return current_user
+
+    @staticmethod
+    def user_from_claims(decoded_token: Dict) -> Dict:
+        """
+        Build the current user from verified token claims. ID tokens carry
+        email and name; access tokens only carry the username.
+        """
+        return {
+            'user_id': decoded_token['sub'],
+            'email': decoded_token.get('email'),
+            'name': decoded_token.get('name') or decoded_token.get('cognito:username') or decoded_token.get('username'),
+            'token_claims': decoded_token
+        }
+
     def get_user_info(self, access_token: str) -> Dict:
         """
         Get user information from Cognito
@@ -170,6 +240,9 @@ class CognitoAuth:
         """
         Sign out user (invalidate token)
         """
+        with self._token_cache_lock:
+            self._token_cache.pop(self._token_key(access_token), None)
+
         try:
             self.cognito_client.global_sign_out(
                 AccessToken=access_token
@@ -212,17 +285,12 @@ class CognitoAuth:
 
 # Security dependency
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
-# Global auth instance
-cognito_auth = None
-
-
+@lru_cache(maxsize=None)
 def get_cognito_auth() -> CognitoAuth:
-    """Get or create CognitoAuth instance"""
-    global cognito_auth
-    if cognito_auth is None:
-        cognito_auth = CognitoAuth()
-    return cognito_auth
+    """Get singleton CognitoAuth instance"""
+    return CognitoAuth()
 
 
 async def get_current_user(
@@ -233,24 +301,18 @@ async def get_current_user(
     Dependency to get current authenticated user from JWT token
     """
     token = credentials.credentials
+    current_user = auth.get_cached_user(token)
+    if current_user is not None:
+        return current_user
 
-    # Verify and decode token
-    decoded_token = auth.verify_token(token)
-
-    # Get user info
-    user_info = auth.get_user_info(token)
-
-    return {
-        'user_id': user_info['sub'],
-        'email': user_info['email'],
-        'name': user_info['name'],
-        'token_claims': decoded_token
-    }
+    # A cache miss may fetch signing keys from Cognito's JWKS endpoint,
+    # so verify in a worker thread instead of blocking the event loop
+    return await asyncio.to_thread(auth.authenticate, token)
 
 
 async def get_current_user_optional(
-    auth: CognitoAuth = Depends(get_cognito_auth),
-    credentials: Optional[HTTPAuthorizationCredentials] = None
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(optional_security),
+    auth: CognitoAuth = Depends(get_cognito_auth)
 ) -> Optional[Dict]:
     """
     Optional authentication - returns None if no token provided
@@ -258,13 +320,4 @@ async def get_current_user_optional(
     if credentials is None:
         return None
 
-    token = credentials.credentials
-    decoded_token = auth.verify_token(token)
-    user_info = auth.get_user_info(token)
-
-    return {
-        'user_id': user_info['sub'],
-        'email': user_info['email'],
-        'name': user_info['name'],
-        'token_claims': decoded_token
-    }
+    return await get_current_user(credentials, auth)
@@ -1,11 +1,102 @@
 """
 AWS service integrations (S3, Textract, Bedrock)
 """
+import asyncio
 import boto3
 import json
-from typing import Dict, Optional, List
+import orjson
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from typing import BinaryIO, Dict, Iterator, Optional, List, Tuple
 from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
 import os
+import re
+import time
+
+try:
+    import fitz  # PyMuPDF, used to render PDF bills for Claude vision
+except ImportError:
+    fitz = None
+
+# Files above this size are uploaded to S3 in parallel multipart chunks
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Chunk size used when streaming downloads from S3
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Claude vision downscales anything with a longer edge than this
+MAX_VISION_EDGE_PX = 1568
+
+# File signatures for the upload formats Claude vision accepts (plus PDF)
+_MAGIC = {
+    b'%PDF': "application/pdf",
+    b'\x89PNG': "image/png",
+    b'\xff\xd8\xff': "image/jpeg",
+    b'GIF8': "image/gif",
+    b'RIFF': "image/webp",  # RIFF container, confirmed as WEBP below
+}
+
+
+def _detect_media_type(data: bytes) -> str:
+    """Detect media type from leading magic bytes, defaulting to JPEG"""
+    media_type = _MAGIC.get(data[:4]) or _MAGIC.get(data[:3])
+    if media_type == "image/webp" and data[8:12] != b'WEBP':
+        media_type = None
+    return media_type or "image/jpeg"
+
+
+# Claude sometimes wraps its JSON answer in a markdown code fence
+# The opening and closing fences are each optional
+_FENCE_RE = re.compile(r'^\s*(?:```(?:json)?)?\s*(.*?)\s*(?:```)?\s*$', re.DOTALL)
+
+
+def _parse_claude_json(response_text: str) -> Dict:
+    """Parse a JSON answer from Claude, stripping any markdown fence"""
+    return orjson.loads(_FENCE_RE.match(response_text).group(1))
+
+
+# Prompts for Claude vision bill extraction; the template takes {bill_type}
+_BILL_IMAGE_SYSTEM_PROMPT = """You are an AI assistant specialized in extracting structured data from utility bills.
+Your task is to analyze bill images and return structured JSON data."""
+
+_BILL_IMAGE_PROMPT_TEMPLATE = """
+Please analyze this utility bill image and extract the following information.
+
+Bill Type Hint: {bill_type}
+
+Extract and return a JSON object with these fields (set to null if not found):
+{{
+  "bill_type": "electricity|water|gas|fuel|waste",
+  "provider_name": "string",
+  "account_number": "string",
+  "billing_period_start": "YYYY-MM-DD",
+  "billing_period_end": "YYYY-MM-DD",
+  "consumption_amount": number,
+  "consumption_unit": "string (kWh, m³, liters, etc.)",
+  "total_amount": number,
+  "currency": "string (USD, EUR, AED, etc.)",
+  "additional_charges": {{
+    "tax": number,
+    "fees": number
+  }},
+  "confidence_notes": "string - any uncertainties"
+}}
+
+Return ONLY the JSON object, no additional text.
+"""
+
+# Shared client config: a connection pool large enough for concurrent
+# requests, kept-alive sockets so TLS handshakes are reused, and adaptive
+# retries for throttling. The read timeout leaves room for Claude vision.
+BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'mode': 'adaptive', 'max_attempts': 5},
+    connect_timeout=5,
+    read_timeout=60
+)
 
 
 class S3Service:
@@ -14,7 +105,12 @@ class S3Service:
     def __init__(self, bucket_name: str, region: str = "us-east-1"):
         self.bucket_name = bucket_name
         self.region = region
-        self.s3_client = boto3.client('s3', region_name=region)
+        self.s3_client = boto3.client('s3', region_name=region, config=BOTO_CONFIG)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=MULTIPART_CHUNK_SIZE,
+            max_concurrency=10
+        )
 
     def upload_file(self, file_content: bytes, key: str, metadata: Optional[Dict] = None) -> str:
         """
@@ -25,6 +121,26 @@ class S3Service:
             key: S3 object key
             metadata: Optional metadata dict
 
+        Returns:
+            S3 object URL
+        """
+        # Goes through the transfer manager so large files use parallel
+        # multipart uploads; small ones are still a single PUT
+        return self.upload_fileobj(BytesIO(file_content), key, metadata)
+
+    def upload_fileobj(self, fileobj: BinaryIO, key: str, metadata: Optional[Dict] = None) -> str:
+        """
+        Stream a file-like object to S3
+
+        The object is read chunk by chunk and large files are uploaded as
+        parallel multipart parts, so memory use is bounded by the chunk size
+        and concurrency rather than the file size.
+
+        Args:
+            fileobj: Readable binary file-like object
+            key: S3 object key
+            metadata: Optional metadata dict
+
         Returns:
             S3 object URL
         """
@@ -32,11 +148,12 @@ class S3Service:
         if metadata:
             extra_args['Metadata'] = metadata
 
-        self.s3_client.put_object(
-            Bucket=self.bucket_name,
-            Key=key,
-            Body=file_content,
-            **extra_args
+        self.s3_client.upload_fileobj(
+            fileobj,
+            self.bucket_name,
+            key,
+            ExtraArgs=extra_args,
+            Config=self.transfer_config
         )
 
         return f"s3://{self.bucket_name}/{key}"
@@ -46,6 +163,20 @@ class S3Service:
         response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
         return response['Body'].read()
 
+    def stream_file(self, key: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Tuple[Iterator[bytes], Optional[int]]:
+        """
+        Stream file from S3 without buffering it in memory
+
+        Args:
+            key: S3 object key
+            chunk_size: Size of each yielded chunk in bytes
+
+        Returns:
+            Tuple of (chunk iterator, content length in bytes)
+        """
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+        return response['Body'].iter_chunks(chunk_size), response.get('ContentLength')
+
     def generate_presigned_url(self, key: str, expiration: int = 3600) -> str:
         """Generate presigned URL for file access"""
         url = self.s3_client.generate_presigned_url(
@@ -65,7 +196,7 @@ class TextractService:
 
     def __init__(self, region: str = "us-east-1"):
         self.region = region
-        self.textract_client = boto3.client('textract', region_name=region)
+        self.textract_client = boto3.client('textract', region_name=region, config=BOTO_CONFIG)
 
     def extract_text(self, file_content: bytes, feature_types: Optional[List[str]] = None) -> Dict:
         """
@@ -88,6 +219,71 @@ class TextractService:
 
         return self._parse_textract_response(response)
 
+    async def extract_text_async(
+        self,
+        bucket: str,
+        key: str,
+        feature_types: Optional[List[str]] = None,
+        max_wait: float = 300
+    ) -> Dict:
+        """
+        Extract text from a multi-page document already stored in S3
+
+        Textract analyzes the pages server-side in parallel; the job is
+        polled with exponential backoff and its results fetched page by page.
+        The boto3 calls run in worker threads and the waits are asyncio
+        sleeps, so the event loop stays free while the job runs.
+
+        Args:
+            bucket: S3 bucket holding the document
+            key: S3 object key of the document
+            feature_types: Optional list of features to extract (TABLES, FORMS)
+            max_wait: Seconds to wait for the job before giving up
+
+        Returns:
+            Extraction results dict
+        """
+        if feature_types is None:
+            feature_types = ['FORMS', 'TABLES']
+
+        started = await asyncio.to_thread(
+            self.textract_client.start_document_analysis,
+            DocumentLocation={'S3Object': {'Bucket': bucket, 'Name': key}},
+            FeatureTypes=feature_types
+        )
+        job_id = started['JobId']
+
+        deadline = time.monotonic() + max_wait
+        delay = 1
+        while True:
+            response = await asyncio.to_thread(
+                self.textract_client.get_document_analysis, JobId=job_id, MaxResults=1000
+            )
+            if response['JobStatus'] != 'IN_PROGRESS':
+                break
+            if time.monotonic() + delay > deadline:
+                raise Exception(f"Textract job {job_id} did not finish within {max_wait} seconds")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 10)
+
+        if response['JobStatus'] == 'FAILED':
+            raise Exception(f"Textract job {job_id} failed: {response.get('StatusMessage', 'unknown error')}")
+
+        # Blocks reference each other across result pages, so collect them all
+        blocks = response.get('Blocks', [])
+        next_token = response.get('NextToken')
+        while next_token:
+            response = await asyncio.to_thread(
+                self.textract_client.get_document_analysis,
+                JobId=job_id,
+                MaxResults=1000,
+                NextToken=next_token
+            )
+            blocks.extend(response.get('Blocks', []))
+            next_token = response.get('NextToken')
+
+        return await asyncio.to_thread(self._parse_textract_response, {'Blocks': blocks})
+
     def _parse_textract_response(self, response: Dict) -> Dict:
         """
         Parse Textract response into structured format
@@ -105,28 +301,48 @@ class TextractService:
 
         blocks = response.get('Blocks', [])
 
-        # Extract raw text
-        text_blocks = [block for block in blocks if block['BlockType'] == 'LINE']
-        result['raw_text'] = '\n'.join([block.get('Text', '') for block in text_blocks])
-
-        # Calculate average confidence
-        confidences = [block.get('Confidence', 0) for block in blocks if 'Confidence' in block]
-        if confidences:
-            result['confidence'] = sum(confidences) / len(confidences)
-
-        # Extract key-value pairs (forms)
+        # Index, classify and score every block in a single pass
+        block_map = {}
+        text_parts = []
         key_map = {}
         value_map = {}
-        block_map = {block['Id']: block for block in blocks}
+        tables = []
+        confidence_sum = 0
+        confidence_count = 0
 
         for block in blocks:
-            if block['BlockType'] == 'KEY_VALUE_SET':
-                if 'KEY' in block.get('EntityTypes', []):
+            block_type = block['BlockType']
+            block_map[block['Id']] = block
+
+            if block_type == 'LINE':
+                text_parts.append(block.get('Text', ''))
+            elif block_type == 'KEY_VALUE_SET':
+                entity_types = block.get('EntityTypes', [])
+                if 'KEY' in entity_types:
                     key_map[block['Id']] = block
-                elif 'VALUE' in block.get('EntityTypes', []):
+                elif 'VALUE' in entity_types:
                     value_map[block['Id']] = block
+            elif block_type == 'TABLE':
+                tables.append(block)
+
+            confidence = block.get('Confidence')
+            if confidence is not None:
+                confidence_sum += confidence
+                confidence_count += 1
+
+        result['raw_text'] = '\n'.join(text_parts)
+        if confidence_count:
+            result['confidence'] = confidence_sum / confidence_count
+
+        result['forms'] = self._build_forms(key_map, value_map, block_map)
+        result['tables'] = self._build_tables(tables, block_map)
 
-        for key_id, key_block in key_map.items():
+        return result
+
+    def _build_forms(self, key_map: Dict, value_map: Dict, block_map: Dict) -> Dict[str, str]:
+        """Extract key-value pairs (forms) from KEY and VALUE blocks"""
+        forms = {}
+        for key_block in key_map.values():
             key_text = self._get_text_from_block(key_block, block_map)
 
             # Find associated value
@@ -135,16 +351,12 @@ class TextractService:
                     if relationship['Type'] == 'VALUE':
                         for value_id in relationship['Ids']:
                             if value_id in value_map:
-                                value_text = self._get_text_from_block(value_map[value_id], block_map)
-                                result['forms'][key_text] = value_text
+                                forms[key_text] = self._get_text_from_block(value_map[value_id], block_map)
+        return forms
 
-        # Extract tables
-        tables = [block for block in blocks if block['BlockType'] == 'TABLE']
-        for table in tables:
-            table_data = self._parse_table(table, block_map)
-            result['tables'].append(table_data)
-
-        return result
+    def _build_tables(self, tables: List[Dict], block_map: Dict) -> List[List[List[str]]]:
+        """Extract every table as a 2D array of cell text"""
+        return [self._parse_table(table, block_map) for table in tables]
 
     def _get_text_from_block(self, block: Dict, block_map: Dict) -> str:
         """Extract text from a block"""
@@ -160,7 +372,8 @@ class TextractService:
 
     def _parse_table(self, table_block: Dict, block_map: Dict) -> List[List[str]]:
         """Parse table structure from Textract blocks"""
-        rows = {}
+        cells = []
+        max_row = max_col = 0
 
         if 'Relationships' in table_block:
             for relationship in table_block['Relationships']:
@@ -168,21 +381,19 @@ class TextractService:
                     for cell_id in relationship['Ids']:
                         cell = block_map.get(cell_id)
                         if cell and cell.get('BlockType') == 'CELL':
-                            row_index = cell.get('RowIndex', 0)
-                            col_index = cell.get('ColumnIndex', 0)
-
-                            if row_index not in rows:
-                                rows[row_index] = {}
+                            # Textract row/column indexes start at 1
+                            row_index = cell.get('RowIndex', 1)
+                            col_index = cell.get('ColumnIndex', 1)
+                            max_row = max(max_row, row_index)
+                            max_col = max(max_col, col_index)
 
                             cell_text = self._get_text_from_block(cell, block_map)
-                            rows[row_index][col_index] = cell_text
+                            cells.append((row_index, col_index, cell_text))
 
-        # Convert to 2D array
-        table_data = []
-        for row_index in sorted(rows.keys()):
-            row = rows[row_index]
-            row_data = [row.get(col_index, '') for col_index in sorted(row.keys())]
-            table_data.append(row_data)
+        # Fill a pre-sized 2D array; cells missing from the grid stay empty
+        table_data = [[''] * max_col for _ in range(max_row)]
+        for row_index, col_index, cell_text in cells:
+            table_data[row_index - 1][col_index - 1] = cell_text
 
         return table_data
 
@@ -193,7 +404,7 @@ class BedrockService:
     def __init__(self, region: str = "us-east-1", model_id: str = "anthropic.claude-3-sonnet-20240229-v1:0"):
         self.region = region
         self.model_id = model_id
-        self.bedrock_runtime = boto3.client('bedrock-runtime', region_name=region)
+        self.bedrock_runtime = boto3.client('bedrock-runtime', region_name=region, config=BOTO_CONFIG)
 
     def invoke_claude(self, prompt: str, system_prompt: Optional[str] = None, max_tokens: int = 4096) -> str:
         """
@@ -220,10 +431,10 @@ class BedrockService:
 
         response = self.bedrock_runtime.invoke_model(
             modelId=self.model_id,
-            body=json.dumps(body)
+            body=orjson.dumps(body)
         )
 
-        response_body = json.loads(response['body'].read())
+        response_body = orjson.loads(response['body'].read())
         return response_body['content'][0]['text']
 
     def extract_bill_data_from_image(self, image_bytes: bytes, bill_type: Optional[str] = None) -> Dict:
@@ -237,117 +448,63 @@ class BedrockService:
         Returns:
             Structured bill data
         """
-        import base64
-        from io import BytesIO
-        from PIL import Image
+        media_type = _detect_media_type(image_bytes)
 
         # Check if PDF and convert to image
-        if image_bytes[:4] == b'%PDF':
+        if media_type == "application/pdf":
+            if fitz is None:
+                raise Exception("PDF conversion failed: PyMuPDF is not installed")
             try:
-                import fitz  # PyMuPDF
                 # Open PDF from bytes
                 pdf_document = fitz.open(stream=image_bytes, filetype="pdf")
                 # Get first page
                 page = pdf_document[0]
-                # Render page to pixmap (image) at 300 DPI
-                mat = fitz.Matrix(300/72, 300/72)  # 300 DPI scaling
+                # Render at 150 DPI, capped at the largest size Claude vision uses
+                scale = 150 / 72
+                longest_edge = max(page.rect.width, page.rect.height)
+                if longest_edge * scale > MAX_VISION_EDGE_PX:
+                    scale = MAX_VISION_EDGE_PX / longest_edge
+                mat = fitz.Matrix(scale, scale)
                 pix = page.get_pixmap(matrix=mat)
-                # Convert to PNG bytes
-                image_bytes = pix.tobytes("png")
-                media_type = "image/png"
+                # JPEG is far smaller than PNG for scanned bills, which cuts
+                # the upload to Bedrock
+                image_bytes = pix.tobytes("jpeg", jpg_quality=85)
+                media_type = "image/jpeg"
                 pdf_document.close()
             except Exception as e:
                 print(f"Error converting PDF to image: {e}")
                 raise Exception(f"PDF conversion failed: {str(e)}")
-        # Determine media type for images
-        elif image_bytes[:4] == b'\x89PNG':
-            media_type = "image/png"
-        elif image_bytes[:3] == b'\xff\xd8\xff':
-            media_type = "image/jpeg"
-        elif image_bytes[:6] == b'GIF87a' or image_bytes[:6] == b'GIF89a':
-            media_type = "image/gif"
-        elif image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
-            media_type = "image/webp"
-        else:
-            media_type = "image/jpeg"  # Default fallback
-
-        # Encode image to base64
-        image_b64 = base64.b64encode(image_bytes).decode('utf-8')
-
-        system_prompt = """You are an AI assistant specialized in extracting structured data from utility bills.
-Your task is to analyze bill images and return structured JSON data."""
-
-        prompt = f"""
-Please analyze this utility bill image and extract the following information.
-
-Bill Type Hint: {bill_type or 'Unknown - please determine from the image'}
 
-Extract and return a JSON object with these fields (set to null if not found):
-{{
-  "bill_type": "electricity|water|gas|fuel|waste",
-  "provider_name": "string",
-  "account_number": "string",
-  "billing_period_start": "YYYY-MM-DD",
-  "billing_period_end": "YYYY-MM-DD",
-  "consumption_amount": number,
-  "consumption_unit": "string (kWh, m³, liters, etc.)",
-  "total_amount": number,
-  "currency": "string (USD, EUR, AED, etc.)",
-  "additional_charges": {{
-    "tax": number,
-    "fees": number
-  }},
-  "confidence_notes": "string - any uncertainties"
-}}
-
-Return ONLY the JSON object, no additional text.
-"""
+        prompt = _BILL_IMAGE_PROMPT_TEMPLATE.format(
+            bill_type=bill_type or 'Unknown - please determine from the image'
+        )
 
         try:
-            body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 4096,
-                "messages": [
+            # The Converse API takes the raw image bytes, so there is no
+            # hand-built base64 string or JSON request body
+            response = self.bedrock_runtime.converse(
+                modelId=self.model_id,
+                messages=[
                     {
                         "role": "user",
                         "content": [
                             {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": media_type,
-                                    "data": image_b64
+                                "image": {
+                                    "format": media_type.split('/')[1],
+                                    "source": {"bytes": image_bytes}
                                 }
                             },
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
+                            {"text": prompt}
                         ]
                     }
                 ],
-                "system": system_prompt
-            }
-
-            response = self.bedrock_runtime.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(body)
+                system=[{"text": _BILL_IMAGE_SYSTEM_PROMPT}],
+                inferenceConfig={"maxTokens": 4096}
             )
 
-            response_body = json.loads(response['body'].read())
-            response_text = response_body['content'][0]['text']
+            response_text = response['output']['message']['content'][0]['text']
 
-            # Clean and parse JSON
-            response_clean = response_text.strip()
-            if response_clean.startswith('```json'):
-                response_clean = response_clean[7:]
-            if response_clean.startswith('```'):
-                response_clean = response_clean[3:]
-            if response_clean.endswith('```'):
-                response_clean = response_clean[:-3]
-
-            extracted_data = json.loads(response_clean.strip())
-            return extracted_data
+            return _parse_claude_json(response_text)
 
         except Exception as e:
             print(f"Error extracting bill data from image: {e}")
@@ -407,18 +564,7 @@ Return ONLY the JSON object, no additional text.
         try:
             response = self.invoke_claude(prompt, system_prompt)
 
-            # Parse JSON from response
-            # Sometimes Claude adds markdown code blocks, so clean it
-            response_clean = response.strip()
-            if response_clean.startswith('```json'):
-                response_clean = response_clean[7:]
-            if response_clean.startswith('```'):
-                response_clean = response_clean[3:]
-            if response_clean.endswith('```'):
-                response_clean = response_clean[:-3]
-
-            extracted_data = json.loads(response_clean.strip())
-            return extracted_data
+            return _parse_claude_json(response)
 
         except Exception as e:
             print(f"Error extracting bill data with Claude: {e}")
@@ -430,19 +576,33 @@ Return ONLY the JSON object, no additional text.
             }
 
 
-# Factory functions
+# Factory functions (one cached instance per process, so boto3 clients and
+# their connection pools are shared across requests)
 def get_s3_service(bucket_name: Optional[str] = None) -> S3Service:
-    """Get S3 service instance"""
+    """Get S3 service instance (one per bucket, reused across requests)"""
     if bucket_name is None:
         bucket_name = os.getenv('S3_BUCKET_NAME', 'eco-accounting-bills')
+    return _get_s3_service(bucket_name)
+
+
+@lru_cache(maxsize=None)
+def _get_s3_service(bucket_name: str) -> S3Service:
     return S3Service(bucket_name)
 
 
+@lru_cache(maxsize=None)
 def get_textract_service() -> TextractService:
-    """Get Textract service instance"""
+    """Get singleton Textract service instance"""
     return TextractService()
 
 
+@lru_cache(maxsize=None)
 def get_bedrock_service() -> BedrockService:
-    """Get Bedrock service instance"""
+    """Get singleton Bedrock service instance"""
     return BedrockService()
+
+
+@lru_cache(maxsize=None)
+def get_lambda_client():
+    """Get singleton Lambda client, used to queue work as async invocations"""
+    return boto3.client('lambda', config=BOTO_CONFIG)
@@ -1,11 +1,87 @@
 """
 Carbon emission calculation engine
 """
-import json
+import orjson
 import os
+import sys
+from collections.abc import Mapping
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
 from typing import Dict, Optional, Tuple
 from pathlib import Path
 
+# Parsed factor files keyed by path, with the mtime they were read at, so
+# new calculators reuse them until a file changes on disk
+_FACTORS_CACHE: Dict[str, Tuple[float, Dict]] = {}
+
+
+def _load_factor_file(file_path: str) -> Optional[Dict]:
+    """Load a factor JSON file, reusing the parsed copy while its mtime is unchanged"""
+    try:
+        mtime = os.stat(file_path).st_mtime
+    except FileNotFoundError:
+        return None
+
+    cached = _FACTORS_CACHE.get(file_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(file_path, "rb") as f:
+        data = orjson.loads(f.read())
+    _FACTORS_CACHE[file_path] = (mtime, data)
+    return data
+
+
+@dataclass(frozen=True, slots=True)
+class EmissionResult:
+    """Result of one emission calculation"""
+    consumption_amount: float
+    consumption_unit: str
+    emission_factor: float
+    emission_factor_unit: str
+    emission_factor_source: str
+    total_co2e: float
+    total_co2e_tonnes: float
+    category: str
+    source_type: str
+
+    def __getitem__(self, key: str):
+        # Keeps dict-style access (result["total_co2e"]) working
+        return getattr(self, key)
+
+
+class _LazyFactors(Mapping):
+    """Factor databases by category, each JSON file loaded on first access"""
+
+    CATEGORIES = ("electricity", "fuel", "water", "waste")
+
+    def __init__(self, emission_factors_path: str):
+        self._path = emission_factors_path
+        self._loaded: Dict[str, Optional[Dict]] = {}
+
+    def __getitem__(self, category: str) -> Dict:
+        if category not in self._loaded:
+            if category not in self.CATEGORIES:
+                raise KeyError(category)
+            self._loaded[category] = _load_factor_file(os.path.join(self._path, f"{category}.json"))
+
+        data = self._loaded[category]
+        if data is None:
+            raise KeyError(category)
+        return data
+
+    def __iter__(self):
+        return (category for category in self.CATEGORIES if category in self)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+@lru_cache(maxsize=1024)
+def _norm(name: str) -> str:
+    """Normalize a fuel/waste/disposal name to factor-file key form (interned)"""
+    return sys.intern(name.lower().replace(" ", "_"))
+
 
 class CarbonCalculator:
     """Calculate carbon emissions based on consumption data and emission factors"""
@@ -19,19 +95,51 @@ class CarbonCalculator:
         self.emission_factors_path = emission_factors_path
         self.factors = self._load_emission_factors()
 
-    def _load_emission_factors(self) -> Dict:
-        """Load all emission factor databases"""
-        factors = {}
-        factor_files = ["electricity.json", "fuel.json", "water.json", "waste.json"]
-
-        for file_name in factor_files:
-            file_path = os.path.join(self.emission_factors_path, file_name)
-            if os.path.exists(file_path):
-                with open(file_path, "r") as f:
-                    category = file_name.replace(".json", "")
-                    factors[category] = json.load(f)
+        # Factor lookups are pure for a loaded factor set and are called with
+        # the same few keys (country/region, fuel, waste and disposal method),
+        # so memoize per instance
+        self.get_electricity_factor = lru_cache(maxsize=1024)(self.get_electricity_factor)
+        self.get_fuel_factor = lru_cache(maxsize=256)(self.get_fuel_factor)
+        self.get_waste_factor = lru_cache(maxsize=256)(self.get_waste_factor)
+
+    def _load_emission_factors(self) -> _LazyFactors:
+        """Emission factor databases, each loaded on first access"""
+        return _LazyFactors(self.emission_factors_path)
+
+    # Flat factor tables for the hot lookups, built from the nested JSON the
+    # first time a category is used: electricity keyed by (country, region
+    # or None) to (factor, source), waste keyed by (disposal method, waste type)
+    @cached_property
+    def _electricity_index(self) -> Dict[Tuple[str, Optional[str]], Tuple[float, str]]:
+        electricity_index = {}
+        for country, country_data in self.factors.get("electricity", {}).get("factors", {}).get("countries", {}).items():
+            if "national_grid" in country_data:
+                electricity_index[(country, None)] = (country_data["national_grid"], f"{country} national grid")
+            for region, factor in country_data.get("regions", {}).items():
+                electricity_index[(country, region)] = (factor, f"{country} - {region} grid")
+        return electricity_index
+
+    @cached_property
+    def _electricity_default(self) -> Tuple[float, str]:
+        return self.factors.get("electricity", {}).get("factors", {}).get("global_average", 0.475), "Global average"
+
+    @cached_property
+    def _fuel_index(self) -> Dict[str, Dict]:
+        return {_norm(fuel): data for fuel, data in self.factors.get("fuel", {}).get("factors", {}).items()}
+
+    @cached_property
+    def _waste_index(self) -> Dict[Tuple[str, str], float]:
+        disposal_methods = self.factors.get("waste", {}).get("factors", {}).get("disposal_methods", {})
+        return {
+            (_norm(method), _norm(waste_type)): factor
+            for method, method_data in disposal_methods.items()
+            for waste_type, factor in method_data.items()
+            if isinstance(factor, (int, float))
+        }
 
-        return factors
+    @cached_property
+    def _waste_default(self) -> float:
+        return self._waste_index.get((_norm("landfill"), _norm("mixed_waste")), 583)
 
     def get_electricity_factor(self, country: str, region: Optional[str] = None) -> Tuple[float, str]:
         """
@@ -40,29 +148,13 @@ class CarbonCalculator:
         Returns:
             Tuple of (emission_factor, source_description)
         """
-        electricity_factors = self.factors.get("electricity", {}).get("factors", {})
-
-        # Try to get country-specific factor
-        if country in electricity_factors.get("countries", {}):
-            country_data = electricity_factors["countries"][country]
+        if region:
+            found = self._electricity_index.get((country, region))
+            if found is not None:
+                return found
 
-            # Try to get region-specific factor
-            if region and "regions" in country_data:
-                if region in country_data["regions"]:
-                    factor = country_data["regions"][region]
-                    source = f"{country} - {region} grid"
-                    return factor, source
-
-            # Fall back to national grid
-            if "national_grid" in country_data:
-                factor = country_data["national_grid"]
-                source = f"{country} national grid"
-                return factor, source
-
-        # Fall back to global average
-        factor = electricity_factors.get("global_average", 0.475)
-        source = "Global average"
-        return factor, source
+        # Fall back to national grid, then global average
+        return self._electricity_index.get((country, None), self._electricity_default)
 
     def get_fuel_factor(self, fuel_type: str) -> Tuple[float, str, str]:
         """
@@ -71,12 +163,9 @@ class CarbonCalculator:
         Returns:
             Tuple of (emission_factor, unit, source_description)
         """
-        fuel_factors = self.factors.get("fuel", {}).get("factors", {})
+        fuel_data = self._fuel_index.get(_norm(fuel_type))
 
-        fuel_type_normalized = fuel_type.lower().replace(" ", "_")
-
-        if fuel_type_normalized in fuel_factors:
-            fuel_data = fuel_factors[fuel_type_normalized]
+        if fuel_data is not None:
             factor = fuel_data.get("value", 0)
             unit = fuel_data.get("unit", "kg CO2e per unit")
             source = f"EPA/IPCC - {fuel_type}"
@@ -113,30 +202,19 @@ class CarbonCalculator:
         Returns:
             Tuple of (emission_factor, source_description)
         """
-        waste_factors = self.factors.get("waste", {}).get("factors", {}).get("disposal_methods", {})
-
-        disposal_method_normalized = disposal_method.lower().replace(" ", "_")
-        waste_type_normalized = waste_type.lower().replace(" ", "_")
-
-        if disposal_method_normalized in waste_factors:
-            method_data = waste_factors[disposal_method_normalized]
-
-            if waste_type_normalized in method_data:
-                factor = method_data[waste_type_normalized]
-                source = f"{disposal_method} - {waste_type}"
-                return factor, source
+        factor = self._waste_index.get((_norm(disposal_method), _norm(waste_type)))
+        if factor is not None:
+            return factor, f"{disposal_method} - {waste_type}"
 
         # Default to mixed waste in landfill
-        factor = waste_factors.get("landfill", {}).get("mixed_waste", 583)
-        source = "Landfill - mixed waste (default)"
-        return factor, source
+        return self._waste_default, "Landfill - mixed waste (default)"
 
     def calculate_electricity_emissions(
         self,
         consumption_kwh: float,
         country: str,
         region: Optional[str] = None
-    ) -> Dict:
+    ) -> EmissionResult:
         """
         Calculate CO2 emissions from electricity consumption
 
@@ -146,29 +224,29 @@ class CarbonCalculator:
             region: Optional region within country
 
         Returns:
-            Dict with calculation results
+            EmissionResult with calculation results
         """
         emission_factor, source = self.get_electricity_factor(country, region)
         total_co2e = consumption_kwh * emission_factor
 
-        return {
-            "consumption_amount": consumption_kwh,
-            "consumption_unit": "kWh",
-            "emission_factor": emission_factor,
-            "emission_factor_unit": "kg CO2e per kWh",
-            "emission_factor_source": source,
-            "total_co2e": total_co2e,
-            "total_co2e_tonnes": total_co2e / 1000,
-            "category": "Scope 2",
-            "source_type": "electricity"
-        }
+        return EmissionResult(
+            consumption_amount=consumption_kwh,
+            consumption_unit="kWh",
+            emission_factor=emission_factor,
+            emission_factor_unit="kg CO2e per kWh",
+            emission_factor_source=source,
+            total_co2e=total_co2e,
+            total_co2e_tonnes=total_co2e / 1000,
+            category="Scope 2",
+            source_type="electricity"
+        )
 
     def calculate_fuel_emissions(
         self,
         consumption_amount: float,
         fuel_type: str,
         unit: Optional[str] = None
-    ) -> Dict:
+    ) -> EmissionResult:
         """
         Calculate CO2 emissions from fuel consumption
 
@@ -178,28 +256,28 @@ class CarbonCalculator:
             unit: Optional unit override
 
         Returns:
-            Dict with calculation results
+            EmissionResult with calculation results
         """
         emission_factor, factor_unit, source = self.get_fuel_factor(fuel_type)
         total_co2e = consumption_amount * emission_factor
 
-        return {
-            "consumption_amount": consumption_amount,
-            "consumption_unit": unit or factor_unit,
-            "emission_factor": emission_factor,
-            "emission_factor_unit": factor_unit,
-            "emission_factor_source": source,
-            "total_co2e": total_co2e,
-            "total_co2e_tonnes": total_co2e / 1000,
-            "category": "Scope 1",
-            "source_type": "fuel"
-        }
+        return EmissionResult(
+            consumption_amount=consumption_amount,
+            consumption_unit=unit or factor_unit,
+            emission_factor=emission_factor,
+            emission_factor_unit=factor_unit,
+            emission_factor_source=source,
+            total_co2e=total_co2e,
+            total_co2e_tonnes=total_co2e / 1000,
+            category="Scope 1",
+            source_type="fuel"
+        )
 
     def calculate_water_emissions(
         self,
         consumption_m3: float,
         water_type: str = "water_supply"
-    ) -> Dict:
+    ) -> EmissionResult:
         """
         Calculate CO2 emissions from water consumption
 
@@ -208,29 +286,29 @@ class CarbonCalculator:
             water_type: Type of water service
 
         Returns:
-            Dict with calculation results
+            EmissionResult with calculation results
         """
         emission_factor, source = self.get_water_factor(water_type)
         total_co2e = consumption_m3 * emission_factor
 
-        return {
-            "consumption_amount": consumption_m3,
-            "consumption_unit": "m³",
-            "emission_factor": emission_factor,
-            "emission_factor_unit": "kg CO2e per m³",
-            "emission_factor_source": source,
-            "total_co2e": total_co2e,
-            "total_co2e_tonnes": total_co2e / 1000,
-            "category": "Scope 3",
-            "source_type": "water"
-        }
+        return EmissionResult(
+            consumption_amount=consumption_m3,
+            consumption_unit="m³",
+            emission_factor=emission_factor,
+            emission_factor_unit="kg CO2e per m³",
+            emission_factor_source=source,
+            total_co2e=total_co2e,
+            total_co2e_tonnes=total_co2e / 1000,
+            category="Scope 3",
+            source_type="water"
+        )
 
     def calculate_waste_emissions(
         self,
         waste_tonnes: float,
         waste_type: str,
         disposal_method: str
-    ) -> Dict:
+    ) -> EmissionResult:
         """
         Calculate CO2 emissions from waste
 
@@ -240,22 +318,61 @@ class CarbonCalculator:
             disposal_method: How waste is disposed
 
         Returns:
-            Dict with calculation results
+            EmissionResult with calculation results
         """
         emission_factor, source = self.get_waste_factor(waste_type, disposal_method)
         total_co2e = waste_tonnes * emission_factor
 
-        return {
-            "consumption_amount": waste_tonnes,
-            "consumption_unit": "tonnes",
-            "emission_factor": emission_factor,
-            "emission_factor_unit": "kg CO2e per tonne",
-            "emission_factor_source": source,
-            "total_co2e": total_co2e,
-            "total_co2e_tonnes": total_co2e / 1000,
-            "category": "Scope 3",
-            "source_type": "waste"
-        }
+        return EmissionResult(
+            consumption_amount=waste_tonnes,
+            consumption_unit="tonnes",
+            emission_factor=emission_factor,
+            emission_factor_unit="kg CO2e per tonne",
+            emission_factor_source=source,
+            total_co2e=total_co2e,
+            total_co2e_tonnes=total_co2e / 1000,
+            category="Scope 3",
+            source_type="waste"
+        )
+
+    # Per-bill-type handlers for calculate_emissions: unit conversion, then
+    # the matching calculate_*_emissions call
+
+    def _handle_electricity(self, consumption_amount: float, consumption_unit: str,
+                            country: str, region: Optional[str], **_) -> EmissionResult:
+        # kWh and its spelled-out forms are the only units bills report,
+        # so the amount is taken as kWh
+        return self.calculate_electricity_emissions(consumption_amount, country, region)
+
+    def _handle_fuel(self, consumption_amount: float, consumption_unit: str,
+                     fuel_type: Optional[str], **_) -> EmissionResult:
+        return self.calculate_fuel_emissions(consumption_amount, fuel_type or "diesel", consumption_unit)
+
+    def _handle_gas(self, consumption_amount: float, consumption_unit: str,
+                    fuel_type: Optional[str], **_) -> EmissionResult:
+        return self.calculate_fuel_emissions(consumption_amount, fuel_type or "natural_gas", consumption_unit)
+
+    def _handle_water(self, consumption_amount: float, consumption_unit: str,
+                      water_type: str, **_) -> EmissionResult:
+        # Convert to m³ if needed
+        if consumption_unit.lower() in ["l", "liter", "litre"]:
+            consumption_amount = consumption_amount / 1000
+        return self.calculate_water_emissions(consumption_amount, water_type)
+
+    def _handle_waste(self, consumption_amount: float, consumption_unit: str,
+                      waste_type: str, disposal_method: str, **_) -> EmissionResult:
+        # Convert to tonnes if needed
+        if consumption_unit.lower() in ["kg", "kilogram"]:
+            consumption_amount = consumption_amount / 1000
+        return self.calculate_waste_emissions(consumption_amount, waste_type, disposal_method)
+
+    _DISPATCH = {
+        "electricity": _handle_electricity,
+        "fuel": _handle_fuel,
+        "gas": _handle_gas,
+        "water": _handle_water,
+        "waste": _handle_waste,
+    }
 
     def calculate_emissions(
         self,
@@ -268,7 +385,7 @@ class CarbonCalculator:
         water_type: Optional[str] = "water_supply",
         waste_type: Optional[str] = "mixed_waste",
         disposal_method: Optional[str] = "landfill"
-    ) -> Dict:
+    ) -> EmissionResult:
         """
         Generic emission calculation based on bill type
 
@@ -284,51 +401,73 @@ class CarbonCalculator:
             disposal_method: Waste disposal method (if applicable)
 
         Returns:
-            Dict with calculation results
+            EmissionResult with calculation results
         """
-        bill_type_lower = bill_type.lower()
-
-        if bill_type_lower == "electricity":
-            # Convert to kWh if needed
-            if consumption_unit.lower() in ["kwh", "kilowatt-hour", "kilowatt hour"]:
-                consumption_kwh = consumption_amount
-            else:
-                # Assume it's already in kWh
-                consumption_kwh = consumption_amount
-
-            return self.calculate_electricity_emissions(consumption_kwh, country, region)
-
-        elif bill_type_lower in ["fuel", "gas"]:
-            if not fuel_type:
-                fuel_type = "natural_gas" if bill_type_lower == "gas" else "diesel"
-
-            return self.calculate_fuel_emissions(consumption_amount, fuel_type, consumption_unit)
-
-        elif bill_type_lower == "water":
-            # Convert to m³ if needed
-            if consumption_unit.lower() in ["m3", "m³", "cubic meter", "cubic metre"]:
-                consumption_m3 = consumption_amount
-            elif consumption_unit.lower() in ["l", "liter", "litre"]:
-                consumption_m3 = consumption_amount / 1000
-            else:
-                consumption_m3 = consumption_amount
-
-            return self.calculate_water_emissions(consumption_m3, water_type)
-
-        elif bill_type_lower == "waste":
-            # Convert to tonnes if needed
-            if consumption_unit.lower() in ["kg", "kilogram"]:
-                waste_tonnes = consumption_amount / 1000
-            elif consumption_unit.lower() in ["t", "tonne", "ton"]:
-                waste_tonnes = consumption_amount
-            else:
-                waste_tonnes = consumption_amount
-
-            return self.calculate_waste_emissions(waste_tonnes, waste_type, disposal_method)
-
-        else:
+        handler = self._DISPATCH.get(bill_type.lower())
+        if handler is None:
             raise ValueError(f"Unsupported bill type: {bill_type}")
 
+        return handler(
+            self,
+            consumption_amount,
+            consumption_unit,
+            country=country,
+            region=region,
+            fuel_type=fuel_type,
+            water_type=water_type,
+            waste_type=waste_type,
+            disposal_method=disposal_method
+        )
+
+    def calculate_emissions_bulk(self, rows):
+        """
+        Vectorized calculate_emissions over many consumption records
+
+        Args:
+            rows: pandas DataFrame (or columnar dict) with bill_type,
+                consumption_amount and consumption_unit columns, plus any of
+                the optional country, region, fuel_type, water_type,
+                waste_type and disposal_method arguments of calculate_emissions
+
+        Returns:
+            DataFrame with the calculate_emissions result for each input row
+        """
+        import numpy as np
+        import pandas as pd
+
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return pd.DataFrame(columns=[
+                "consumption_amount", "consumption_unit", "emission_factor",
+                "emission_factor_unit", "emission_factor_source", "total_co2e",
+                "total_co2e_tonnes", "category", "source_type"
+            ])
+
+        key_columns = ["bill_type", "consumption_unit"] + [
+            name for name in ("country", "region", "fuel_type", "water_type", "waste_type", "disposal_method")
+            if name in df
+        ]
+        codes = df.groupby(key_columns, sort=False, dropna=False).ngroup().to_numpy()
+        # Unsorted groups are numbered in order of first appearance, so a
+        # key's first row is wherever the running maximum code increases
+        first_rows = np.flatnonzero(np.diff(np.maximum.accumulate(codes), prepend=-1) > 0)
+
+        # Emissions are linear in the amount, so calculating one unit per
+        # distinct key gives its unit conversion, factor and labels
+        per_key = []
+        for i in first_rows:
+            kwargs = {name: df[name].iat[i] for name in key_columns if pd.notna(df[name].iat[i])}
+            kwargs.setdefault("consumption_unit", "")
+            per_key.append(self.calculate_emissions(consumption_amount=1.0, **kwargs))
+
+        result = pd.DataFrame(per_key).iloc[codes]
+        result.index = df.index
+        consumption = df["consumption_amount"].astype(float).to_numpy() * result["consumption_amount"].to_numpy()
+        result["consumption_amount"] = consumption
+        result["total_co2e"] = consumption * result["emission_factor"].to_numpy()
+        result["total_co2e_tonnes"] = result["total_co2e"] / 1000
+        return result
+
 
 # Singleton instance
 _calculator = None
@@ -7,55 +7,139 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
+from collections import defaultdict
 from datetime import datetime
-from typing import Dict, List, Optional
+from functools import lru_cache
+from typing import BinaryIO, Dict, List, Optional, Union
+import copy
 import io
 
 
+# Static methodology section shared by every GRI 305 report
+_METHODOLOGY_TEXT = """
+    <b>Calculation Approach:</b><br/>
+    This GHG inventory follows the operational control approach as defined by the GHG Protocol.
+    Emissions are calculated using the formula:<br/><br/>
+    <i>Emissions (CO2e) = Activity Data × Emission Factor</i><br/><br/>
+
+    <b>Emission Factors:</b><br/>
+    Emission factors are sourced from internationally recognized databases including:<br/>
+    • International Energy Agency (IEA)<br/>
+    • U.S. Environmental Protection Agency (EPA)<br/>
+    • UK Department for Environment, Food & Rural Affairs (DEFRA)<br/>
+    • Intergovernmental Panel on Climate Change (IPCC)<br/><br/>
+
+    <b>Gases Included:</b><br/>
+    The inventory covers the seven greenhouse gases defined by the Kyoto Protocol:<br/>
+    • Carbon Dioxide (CO2)<br/>
+    • Methane (CH4)<br/>
+    • Nitrous Oxide (N2O)<br/>
+    • Hydrofluorocarbons (HFCs)<br/>
+    • Perfluorocarbons (PFCs)<br/>
+    • Sulphur Hexafluoride (SF6)<br/>
+    • Nitrogen Trifluoride (NF3)<br/><br/>
+
+    All emissions are converted to CO2 equivalent (CO2e) using global warming potential (GWP) values
+    from the IPCC Fifth Assessment Report (AR5).
+    """
+
+
 class GRIReportGenerator:
     """Generate GRI-compliant sustainability reports"""
 
-    def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self._setup_custom_styles()
+    # Shared by every scope breakdown table; built once at import
+    _SCOPE_TABLE_STYLE = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
 
-    def _setup_custom_styles(self):
+    def __init__(self):
+        self.styles = self._get_styles()
+
+    @classmethod
+    @lru_cache(maxsize=1)
+    def _parsed_methodology(cls):
+        """Methodology Paragraph, markup parsed once"""
+        return Paragraph(_METHODOLOGY_TEXT, cls._get_styles()['Normal'])
+
+    def _methodology_paragraph(self):
+        """Fresh copy of the parsed methodology; layout state stays per report"""
+        return copy.copy(self._parsed_methodology())
+
+    @classmethod
+    @lru_cache(maxsize=1)
+    def _get_styles(cls):
+        """Sample stylesheet plus custom styles, built once and shared"""
+        styles = getSampleStyleSheet()
+        cls._setup_custom_styles(styles)
+        return styles
+
+    @staticmethod
+    def _setup_custom_styles(styles):
         """Setup custom paragraph styles"""
-        self.styles.add(ParagraphStyle(
+        if 'CustomTitle' in styles.byName:
+            return
+
+        styles.add(ParagraphStyle(
             name='CustomTitle',
-            parent=self.styles['Heading1'],
+            parent=styles['Heading1'],
             fontSize=24,
             textColor=colors.HexColor('#1e3a8a'),
             spaceAfter=30,
             alignment=TA_CENTER
         ))
 
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='SectionHeader',
-            parent=self.styles['Heading2'],
+            parent=styles['Heading2'],
             fontSize=16,
             textColor=colors.HexColor('#1e3a8a'),
             spaceAfter=12,
             spaceBefore=12
         ))
 
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='Subsection',
-            parent=self.styles['Heading3'],
+            parent=styles['Heading3'],
             fontSize=12,
             textColor=colors.HexColor('#2563eb'),
             spaceAfter=6,
             spaceBefore=6
         ))
 
+    def _append_scope_table(self, elements: List, source_totals: Optional[Dict[str, Dict]]):
+        """Append the per-source breakdown table for one scope, if it has any sources"""
+        if not source_totals:
+            return
+
+        table_data = [['Source Type', 'Consumption', 'CO2e (kg)', 'CO2e (tonnes)']]
+        for source, data in source_totals.items():
+            table_data.append([
+                source.capitalize(),
+                f"{data['consumption']:,.2f} {data['unit']}",
+                f"{data['co2e']:,.2f}",
+                f"{data['co2e']/1000:,.2f}"
+            ])
+
+        table = Table(table_data, colWidths=[2*inch, 2*inch, 1.5*inch, 1.5*inch])
+        table.setStyle(self._SCOPE_TABLE_STYLE)
+        elements.append(table)
+        elements.append(Spacer(1, 20))
+
     def generate_gri_305_report(
         self,
         organization_data: Dict,
         emissions_data: List[Dict],
         period_start: datetime,
         period_end: datetime,
-        output_path: Optional[str] = None
-    ) -> bytes:
+        output: Optional[Union[str, BinaryIO]] = None
+    ) -> Optional[bytes]:
         """
         Generate GRI 305 (Emissions) report
 
@@ -64,15 +148,17 @@ class GRIReportGenerator:
             emissions_data: List of emission records
             period_start: Reporting period start
             period_end: Reporting period end
-            output_path: Optional file path to save PDF
+            output: Optional file path or writable binary file object to
+                render the PDF into directly
 
         Returns:
-            PDF content as bytes
+            PDF content as bytes, or None when written to output
         """
-        # Create PDF buffer
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72,
-                                topMargin=72, bottomMargin=18)
+        # Render straight into the caller's file when given one; only the
+        # bytes-returning form needs an in-memory buffer
+        buffer = io.BytesIO() if output is None else None
+        doc = SimpleDocTemplate(buffer if output is None else output, pagesize=A4,
+                                rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
 
         # Build document elements
         elements = []
@@ -105,11 +191,25 @@ class GRIReportGenerator:
         elements.append(Paragraph("Executive Summary", self.styles['SectionHeader']))
         elements.append(Spacer(1, 12))
 
-        # Calculate totals
-        total_emissions = sum(e.get('total_co2e', 0) for e in emissions_data) / 1000  # Convert to tonnes
-        scope_1 = sum(e.get('total_co2e', 0) for e in emissions_data if e.get('category') == 'Scope 1') / 1000
-        scope_2 = sum(e.get('total_co2e', 0) for e in emissions_data if e.get('category') == 'Scope 2') / 1000
-        scope_3 = sum(e.get('total_co2e', 0) for e in emissions_data if e.get('category') == 'Scope 3') / 1000
+        # Calculate scope totals and per-scope source breakdowns in one pass
+        scope_totals = defaultdict(float)
+        scope_sources = defaultdict(dict)
+        for e in emissions_data:
+            category = e.get('category')
+            co2e = e.get('total_co2e', 0)
+            scope_totals[category] += co2e
+
+            totals = scope_sources[category].setdefault(
+                e.get('source_type', 'Unknown'),
+                {'co2e': 0, 'consumption': 0, 'unit': e.get('consumption_unit', '')}
+            )
+            totals['co2e'] += co2e
+            totals['consumption'] += e.get('consumption_amount', 0)
+
+        total_emissions = sum(scope_totals.values()) / 1000  # Convert to tonnes
+        scope_1 = scope_totals['Scope 1'] / 1000
+        scope_2 = scope_totals['Scope 2'] / 1000
+        scope_3 = scope_totals['Scope 3'] / 1000
 
         summary_text = f"""
         This report presents the greenhouse gas (GHG) emissions inventory for {organization_data.get('name', 'the organization')}
@@ -145,43 +245,7 @@ class GRIReportGenerator:
         elements.append(Spacer(1, 12))
 
         # Scope 1 breakdown table
-        scope1_emissions = [e for e in emissions_data if e.get('category') == 'Scope 1']
-        if scope1_emissions:
-            scope1_table_data = [['Source Type', 'Consumption', 'CO2e (kg)', 'CO2e (tonnes)']]
-
-            source_totals = {}
-            for emission in scope1_emissions:
-                source = emission.get('source_type', 'Unknown')
-                co2e = emission.get('total_co2e', 0)
-                consumption = emission.get('consumption_amount', 0)
-                unit = emission.get('consumption_unit', '')
-
-                if source not in source_totals:
-                    source_totals[source] = {'co2e': 0, 'consumption': 0, 'unit': unit}
-                source_totals[source]['co2e'] += co2e
-                source_totals[source]['consumption'] += consumption
-
-            for source, data in source_totals.items():
-                scope1_table_data.append([
-                    source.capitalize(),
-                    f"{data['consumption']:,.2f} {data['unit']}",
-                    f"{data['co2e']:,.2f}",
-                    f"{data['co2e']/1000:,.2f}"
-                ])
-
-            scope1_table = Table(scope1_table_data, colWidths=[2*inch, 2*inch, 1.5*inch, 1.5*inch])
-            scope1_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            elements.append(scope1_table)
-            elements.append(Spacer(1, 20))
+        self._append_scope_table(elements, scope_sources.get('Scope 1'))
 
         # GRI 305-2: Indirect (Scope 2) Emissions
         elements.append(PageBreak())
@@ -202,43 +266,7 @@ class GRIReportGenerator:
         elements.append(Spacer(1, 12))
 
         # Scope 2 breakdown table
-        scope2_emissions = [e for e in emissions_data if e.get('category') == 'Scope 2']
-        if scope2_emissions:
-            scope2_table_data = [['Source Type', 'Consumption', 'CO2e (kg)', 'CO2e (tonnes)']]
-
-            source_totals = {}
-            for emission in scope2_emissions:
-                source = emission.get('source_type', 'Unknown')
-                co2e = emission.get('total_co2e', 0)
-                consumption = emission.get('consumption_amount', 0)
-                unit = emission.get('consumption_unit', '')
-
-                if source not in source_totals:
-                    source_totals[source] = {'co2e': 0, 'consumption': 0, 'unit': unit}
-                source_totals[source]['co2e'] += co2e
-                source_totals[source]['consumption'] += consumption
-
-            for source, data in source_totals.items():
-                scope2_table_data.append([
-                    source.capitalize(),
-                    f"{data['consumption']:,.2f} {data['unit']}",
-                    f"{data['co2e']:,.2f}",
-                    f"{data['co2e']/1000:,.2f}"
-                ])
-
-            scope2_table = Table(scope2_table_data, colWidths=[2*inch, 2*inch, 1.5*inch, 1.5*inch])
-            scope2_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            elements.append(scope2_table)
-            elements.append(Spacer(1, 20))
+        self._append_scope_table(elements, scope_sources.get('Scope 2'))
 
         # GRI 305-3: Other Indirect (Scope 3) Emissions
         if scope_3 > 0:
@@ -258,46 +286,16 @@ class GRIReportGenerator:
         elements.append(Paragraph("Methodology and Assumptions", self.styles['SectionHeader']))
         elements.append(Spacer(1, 12))
 
-        methodology_text = """
-        <b>Calculation Approach:</b><br/>
-        This GHG inventory follows the operational control approach as defined by the GHG Protocol.
-        Emissions are calculated using the formula:<br/><br/>
-        <i>Emissions (CO2e) = Activity Data × Emission Factor</i><br/><br/>
-
-        <b>Emission Factors:</b><br/>
-        Emission factors are sourced from internationally recognized databases including:<br/>
-        • International Energy Agency (IEA)<br/>
-        • U.S. Environmental Protection Agency (EPA)<br/>
-        • UK Department for Environment, Food & Rural Affairs (DEFRA)<br/>
-        • Intergovernmental Panel on Climate Change (IPCC)<br/><br/>
-
-        <b>Gases Included:</b><br/>
-        The inventory covers the seven greenhouse gases defined by the Kyoto Protocol:<br/>
-        • Carbon Dioxide (CO2)<br/>
-        • Methane (CH4)<br/>
-        • Nitrous Oxide (N2O)<br/>
-        • Hydrofluorocarbons (HFCs)<br/>
-        • Perfluorocarbons (PFCs)<br/>
-        • Sulphur Hexafluoride (SF6)<br/>
-        • Nitrogen Trifluoride (NF3)<br/><br/>
-
-        All emissions are converted to CO2 equivalent (CO2e) using global warming potential (GWP) values
-        from the IPCC Fifth Assessment Report (AR5).
-        """
-        elements.append(Paragraph(methodology_text, self.styles['Normal']))
+        elements.append(self._methodology_paragraph())
 
         # Build PDF
         doc.build(elements)
 
-        # Get PDF bytes
+        if output is not None:
+            return None
+
         pdf_bytes = buffer.getvalue()
         buffer.close()
-
-        # Save to file if path provided
-        if output_path:
-            with open(output_path, 'wb') as f:
-                f.write(pdf_bytes)
-
         return pdf_bytes
 
     def generate_gri_302_report(
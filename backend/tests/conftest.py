@@ -0,0 +1,36 @@
+"""
+Shared fixtures: a throwaway SQLite database and an API client bound to it
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import models.database as database
+from models.database import Base, Organization
+
+
+@pytest.fixture
+def db_session(tmp_path, monkeypatch):
+    """Fresh database with the default organization, one per test"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    database.init_db()
+    Base.metadata.create_all(bind=database.engine)
+
+    # Module-level caches would otherwise leak results between tests
+    main._ETAG_CACHE.clear()
+    main._ESTIMATE_CACHE.clear()
+    main._CREDIT_TOTAL_CACHE.clear()
+
+    session = database.SessionLocal()
+    session.add(Organization(id=main.DEFAULT_ORG_ID, name="Acme"))
+    session.commit()
+    yield session
+    session.close()
+    database.engine.dispose()
+
+
+@pytest.fixture
+def client(db_session):
+    """API client; startup is skipped so no AWS clients are created"""
+    return TestClient(main.app)
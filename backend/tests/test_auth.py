@@ -0,0 +1,116 @@
+"""
+Cognito JWT verification against the user pool's signing keys
+"""
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+
+import main
+from services.auth import CognitoAuth, get_cognito_auth
+
+REGION = "us-east-1"
+POOL_ID = "us-east-1_TestPool"
+CLIENT_ID = "test-client"
+ISSUER = f"https://cognito-idp.{REGION}.amazonaws.com/{POOL_ID}"
+KID = "test-key"
+
+SIGNING_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+OTHER_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+class FakeJWKClient:
+    """Serves the pool's one public key, like PyJWKClient after a JWKS fetch"""
+
+    def get_signing_key(self, kid):
+        if kid != KID:
+            raise jwt.PyJWKClientError(f"Unable to find a signing key that matches: {kid}")
+        return jwt.PyJWK.from_dict({**jwt.algorithms.RSAAlgorithm.to_jwk(SIGNING_KEY.public_key(), as_dict=True), "kid": KID})
+
+
+def make_token(key=SIGNING_KEY, kid=KID, **overrides):
+    now = int(time.time())
+    claims = {
+        "sub": "user-1",
+        "email": "user@example.com",
+        "iss": ISSUER,
+        "aud": CLIENT_ID,
+        "token_use": "id",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    claims.update(overrides)
+    claims = {name: value for name, value in claims.items() if value is not None}
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def auth(monkeypatch):
+    monkeypatch.setenv("AWS_REGION", REGION)
+    monkeypatch.setenv("COGNITO_USER_POOL_ID", POOL_ID)
+    monkeypatch.setenv("COGNITO_CLIENT_ID", CLIENT_ID)
+    cognito_auth = CognitoAuth()
+    cognito_auth._jwk_client = FakeJWKClient()
+    return cognito_auth
+
+
+def assert_rejected(auth, token, detail="Invalid token"):
+    with pytest.raises(HTTPException) as exc_info:
+        auth.verify_token(token)
+    assert exc_info.value.status_code == 401
+    assert exc_info.value.detail == detail
+
+
+def test_valid_id_token(auth):
+    claims = auth.verify_token(make_token())
+    assert claims["sub"] == "user-1"
+    assert claims["email"] == "user@example.com"
+
+
+def test_valid_access_token_checks_client_id(auth):
+    token = make_token(aud=None, client_id=CLIENT_ID, token_use="access", username="user-1")
+    assert auth.verify_token(token)["client_id"] == CLIENT_ID
+
+
+def test_expired_token(auth):
+    now = int(time.time())
+    assert_rejected(auth, make_token(iat=now - 7200, exp=now - 3600), "Token has expired")
+
+
+def test_wrong_issuer(auth):
+    assert_rejected(auth, make_token(iss="https://cognito-idp.us-east-1.amazonaws.com/us-east-1_Other"))
+
+
+def test_wrong_client(auth):
+    assert_rejected(auth, make_token(aud="other-client"))
+
+
+def test_wrong_client_on_access_token(auth):
+    assert_rejected(auth, make_token(aud=None, client_id="other-client", token_use="access"))
+
+
+def test_signed_with_another_key(auth):
+    assert_rejected(auth, make_token(key=OTHER_KEY))
+
+
+def test_unknown_key_id(auth):
+    assert_rejected(auth, make_token(kid="rotated-away"))
+
+
+def test_missing_expiry(auth):
+    assert_rejected(auth, make_token(exp=None))
+
+
+def test_protected_endpoint(client, auth):
+    main.app.dependency_overrides[get_cognito_auth] = lambda: auth
+    try:
+        response = client.get("/api/auth/me", headers={"Authorization": f"Bearer {make_token()}"})
+        assert response.status_code == 200
+        assert response.json()["email"] == "user@example.com"
+
+        response = client.get("/api/auth/me", headers={"Authorization": f"Bearer {make_token(aud='other-client')}"})
+        assert response.status_code == 401
+    finally:
+        main.app.dependency_overrides.clear()
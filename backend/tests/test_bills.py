@@ -0,0 +1,134 @@
+"""
+Bill upload and the extraction that runs after it
+"""
+import orjson
+import pytest
+
+import main
+import services.aws_services as aws_services
+from models.database import Bill, BillStatus
+
+EXTRACTED = {
+    "bill_type": "electricity",
+    "consumption_amount": 1200,
+    "billing_period_start": "2024-01-01",
+    "billing_period_end": "2024-01-31",
+}
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, key, metadata=None):
+        self.objects[key] = fileobj.read()
+        return f"s3://test-bucket/{key}"
+
+    def download_file(self, key):
+        return self.objects[key]
+
+
+class FakeBedrock:
+    def __init__(self):
+        self.seen = []
+
+    def extract_bill_data_from_image(self, image_bytes, bill_type=None):
+        self.seen.append(image_bytes)
+        return dict(EXTRACTED)
+
+
+class FakeLambda:
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, **kwargs):
+        self.invocations.append(kwargs)
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    s3, bedrock, lambda_client = FakeS3(), FakeBedrock(), FakeLambda()
+    monkeypatch.setattr(aws_services, "get_s3_service", lambda: s3)
+    monkeypatch.setattr(aws_services, "get_bedrock_service", lambda: bedrock)
+    monkeypatch.setattr(aws_services, "get_lambda_client", lambda: lambda_client)
+    return s3, bedrock, lambda_client
+
+
+def upload(client, content=b"%PDF-1.4 bill"):
+    response = client.post(
+        "/api/bills/upload",
+        files={"file": ("january.pdf", content, "application/pdf")},
+        data={"bill_type": "electricity"},
+    )
+    assert response.status_code == 202
+    return response.json()["data"]["bill_id"]
+
+
+def load_bill(db_session, bill_id):
+    db_session.expire_all()
+    return db_session.get(Bill, bill_id)
+
+
+def test_upload_extracts_in_background(client, db_session, aws):
+    s3, bedrock, lambda_client = aws
+
+    bill_id = upload(client)
+
+    bill = load_bill(db_session, bill_id)
+    assert bill.status == BillStatus.VALIDATED
+    assert bill.file_size == len(b"%PDF-1.4 bill")
+    assert bill.processed_at is not None
+    assert bill.emission.consumption_amount == 1200
+    # The worker read the file back from S3
+    assert bedrock.seen == [b"%PDF-1.4 bill"]
+    assert lambda_client.invocations == []
+
+
+def test_upload_on_lambda_queues_async_invocation(client, db_session, aws, monkeypatch):
+    s3, bedrock, lambda_client = aws
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "eco-accounting-api")
+
+    bill_id = upload(client)
+
+    assert load_bill(db_session, bill_id).status == BillStatus.PROCESSING
+    assert bedrock.seen == []
+    [invocation] = lambda_client.invocations
+    assert invocation["FunctionName"] == "eco-accounting-api"
+    assert invocation["InvocationType"] == "Event"
+
+    # The async invocation arrives at handler, which runs the extraction
+    payload = orjson.loads(invocation["Payload"])
+    assert main.handler(payload, None) == {"bill_id": bill_id}
+
+    bill = load_bill(db_session, bill_id)
+    assert bill.status == BillStatus.VALIDATED
+    assert bill.emission.total_co2e > 0
+    assert bedrock.seen == [b"%PDF-1.4 bill"]
+
+
+def test_upload_marks_bill_failed_when_queueing_fails(client, db_session, aws, monkeypatch):
+    class DeniedLambda:
+        def invoke(self, **kwargs):
+            raise RuntimeError("AccessDenied")
+
+    monkeypatch.setattr(aws_services, "get_lambda_client", lambda: DeniedLambda())
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "eco-accounting-api")
+
+    response = client.post(
+        "/api/bills/upload",
+        files={"file": ("january.pdf", b"%PDF", "application/pdf")},
+    )
+
+    assert response.status_code == 500
+    bill = db_session.query(Bill).one()
+    assert bill.status == BillStatus.FAILED
+    assert bill.error_message == "Could not queue extraction: AccessDenied"
+
+
+def test_list_bills_includes_processed_at(client, aws):
+    upload(client)
+
+    [bill] = client.get("/api/bills").json()
+
+    assert bill["status"] == "validated"
+    assert bill["processed_at"] is not None
@@ -0,0 +1,34 @@
+"""
+Carbon credit purchases
+"""
+from models.database import CarbonCredit
+
+
+def test_bulk_purchase_ids_follow_input_order(client, db_session):
+    # A row already present means the new ids do not start at 1
+    client.post("/api/carbon-credits/purchase", params={
+        "project_name": "Existing", "project_type": "Forestry",
+        "credits_amount": 1, "price_per_credit": 5,
+    })
+    purchases = [
+        {"project_name": f"Project {i}", "project_type": "Renewable Energy",
+         "credits_amount": i + 1, "price_per_credit": 12.5}
+        for i in range(5)
+    ]
+
+    response = client.post("/api/carbon-credits/purchase/bulk", json=purchases)
+
+    assert response.status_code == 200
+    credits = response.json()["credits"]
+    assert [c["project_name"] for c in credits] == [p["project_name"] for p in purchases]
+    for credit in credits:
+        row = db_session.get(CarbonCredit, credit["id"])
+        assert row.project_name == credit["project_name"]
+        assert row.credits_amount == credit["credits_amount"]
+        assert row.total_cost == credit["total_cost"]
+
+
+def test_bulk_purchase_requires_credits(client):
+    response = client.post("/api/carbon-credits/purchase/bulk", json=[])
+    assert response.status_code == 400
+
@@ -0,0 +1,59 @@
+"""
+Conditional GETs on cacheable reads
+"""
+import main
+from models.database import Bill, BillStatus, BillType
+
+
+def add_bill(db_session, name):
+    bill = Bill(
+        organization_id=main.DEFAULT_ORG_ID,
+        file_name=name,
+        file_path=f"bills/{name}",
+        bill_type=BillType.ELECTRICITY,
+        status=BillStatus.VALIDATED,
+    )
+    db_session.add(bill)
+    db_session.commit()
+    return bill
+
+
+def test_repeat_get_returns_304(client, db_session):
+    add_bill(db_session, "january.pdf")
+
+    first = client.get("/api/bills")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    repeat = client.get("/api/bills", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.headers["ETag"] == etag
+    assert repeat.content == b""
+
+    # The second repeat is answered from the fingerprint cache
+    assert etag in main._ETAG_CACHE.values()
+    assert client.get("/api/bills", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_changed_data_returns_new_etag(client, db_session):
+    add_bill(db_session, "january.pdf")
+    etag = client.get("/api/bills").headers["ETag"]
+    assert client.get("/api/bills", headers={"If-None-Match": etag}).status_code == 304
+
+    add_bill(db_session, "february.pdf")
+    response = client.get("/api/bills", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [bill["file_name"] for bill in response.json()] == ["february.pdf", "january.pdf"]
+
+
+def test_query_string_is_part_of_the_tag(client, db_session):
+    add_bill(db_session, "january.pdf")
+    etag = client.get("/api/bills").headers["ETag"]
+
+    response = client.get("/api/bills", params={"bill_type": "water"}, headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.json() == []
@@ -0,0 +1,110 @@
+"""
+Keyset pagination across rows that share a created_at
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+import main
+from models.database import Bill, BillStatus, BillType, CarbonCredit, Emission
+
+# A bulk insert stamps every row with the same time, so ties must page by id
+SHARED_CREATED_AT = datetime(2024, 1, 15, 12, 0, tzinfo=timezone.utc)
+
+
+def make_bill(i):
+    return Bill(
+        organization_id=main.DEFAULT_ORG_ID,
+        file_name=f"bill-{i}.pdf",
+        file_path=f"bills/bill-{i}.pdf",
+        bill_type=BillType.ELECTRICITY,
+        status=BillStatus.VALIDATED,
+        created_at=SHARED_CREATED_AT,
+    )
+
+
+def make_emission(i):
+    return Emission(
+        organization_id=main.DEFAULT_ORG_ID,
+        category="Scope 2",
+        source_type=BillType.ELECTRICITY,
+        consumption_amount=100.0 + i,
+        consumption_unit="kWh",
+        emission_factor=0.4,
+        total_co2e=40.0,
+        period_start=datetime(2024, 1, 1),
+        period_end=datetime(2024, 1, 31),
+        created_at=SHARED_CREATED_AT,
+    )
+
+
+def make_credit(i):
+    return CarbonCredit(
+        organization_id=main.DEFAULT_ORG_ID,
+        project_name=f"Project {i}",
+        project_type="Renewable Energy",
+        credits_amount=1.0,
+        price_per_credit=10.0,
+        total_cost=10.0,
+        status="active",
+        created_at=SHARED_CREATED_AT,
+    )
+
+
+def page_through(client, path, limit, items_of, cursor_of):
+    seen = []
+    params = {"limit": limit}
+    while True:
+        response = client.get(path, params=params)
+        assert response.status_code == 200
+        items = items_of(response.json())
+        seen.extend(item["id"] for item in items)
+        cursor = cursor_of(response.json(), items)
+        if cursor is None:
+            return seen
+        params = {"limit": limit, **cursor}
+
+
+def last_item_cursor(body, items):
+    if not items:
+        return None
+    return {"before": items[-1]["created_at"], "before_id": items[-1]["id"]}
+
+
+@pytest.mark.parametrize("path, make_row", [
+    ("/api/bills", make_bill),
+    ("/api/emissions", make_emission),
+])
+def test_cursor_pages_through_shared_created_at(client, db_session, path, make_row):
+    rows = [make_row(i) for i in range(7)]
+    db_session.add_all(rows)
+    db_session.commit()
+
+    seen = page_through(client, path, 3, lambda body: body, last_item_cursor)
+
+    assert seen == sorted((row.id for row in rows), reverse=True)
+
+
+def test_carbon_credit_cursor_pages_through_shared_created_at(client, db_session):
+    rows = [make_credit(i) for i in range(7)]
+    db_session.add_all(rows)
+    db_session.commit()
+
+    seen = page_through(
+        client, "/api/carbon-credits", 3,
+        lambda body: body["items"],
+        lambda body, items: body["next_cursor"],
+    )
+
+    assert seen == sorted((row.id for row in rows), reverse=True)
+
+
+def test_carbon_credit_total_on_every_page(client, db_session):
+    db_session.add_all([make_credit(i) for i in range(5)])
+    db_session.commit()
+
+    first = client.get("/api/carbon-credits", params={"limit": 2}).json()
+    second = client.get("/api/carbon-credits", params={"limit": 2, **first["next_cursor"]}).json()
+
+    assert first["total"] == second["total"] == 5
+    assert not second["total_is_estimate"]